@@ -0,0 +1,78 @@
+from typing import Dict
+from .client import QueuedPool, Address
+import asyncio
+import time
+
+
+class BenchmarkPool(QueuedPool):
+    """
+    a QueuedPool where starting and stopping a container costs nothing, so only the pool itself is measured.
+    """
+    @staticmethod
+    async def start_container(uuid: str, address: Address) -> None:
+        pass
+
+    @staticmethod
+    async def stop_container(uuid: str) -> None:
+        pass
+
+
+async def job(_: Address) -> None:
+    """
+    a job that is done as soon as it gets a worker.
+
+    :param _: the address of the worker.
+    :return: None
+    """
+
+
+async def ready(_: Address) -> None:
+    """
+    a container that accepts jobs as soon as it is started.
+
+    :param _: the address of the container.
+    :return: None
+    """
+
+
+async def dispatch_overhead(jobs: int = 2000, workers: int = 4, slots: int = 2) -> Dict[str, float]:
+    """
+    measures what the pool adds to every job.
+
+    the workers are started before measuring. the latency is the time from scheduling a job
+    until its result is back when the jobs come one at a time, the throughput time is the same
+    when all the jobs are scheduled at once. the idle cpu is what the pool uses while it has nothing to do.
+
+    :param jobs: how many jobs to schedule.
+    :param workers: how many workers the pool has.
+    :param slots: how many jobs a worker runs at once.
+    :return: microseconds per job one at a time and all at once, and the cpu seconds used idling for a second.
+    """
+    loop = asyncio.get_running_loop()
+    pool = BenchmarkPool(7000, 7000 + workers - 1, loop, slots=slots, max_jobs=jobs * 2,
+                         max_age=3600, prepare=ready, standby=workers)
+    while sum(worker.started is not None for worker in pool.workers.values()) < workers:
+        await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    for _ in range(jobs):
+        await pool.schedule_process(job)
+    latency = (time.perf_counter() - started) / jobs
+
+    started = time.perf_counter()
+    await asyncio.gather(*(pool.schedule_process(job) for _ in range(jobs)))
+    throughput = (time.perf_counter() - started) / jobs
+
+    # let the tasks of the last jobs finish first
+    await asyncio.sleep(0.1)
+    cpu = time.process_time()
+    await asyncio.sleep(1)
+    idle = time.process_time() - cpu
+    return {"latency": latency * 1e6, "throughput": throughput * 1e6, "idle": idle}
+
+
+if __name__ == '__main__':
+    results = asyncio.run(dispatch_overhead())
+    print(f"one at a time: {results['latency']:.0f}us per job\n"
+          f"all at once: {results['throughput']:.0f}us per job\n"
+          f"idle: {results['idle'] * 1000:.1f}ms cpu per second")
@@ -1,12 +1,28 @@
-from typing import Optional, List, Tuple, Callable, Awaitable, Set
+from typing import (Optional, List, Tuple, Callable, Awaitable, Set, Any, Dict, AsyncIterator, AsyncContextManager,
+                    Union, Deque)
 from ..Common.net import Net
 from ..Common.errors import Errors
-from ..Common.protocol import Protocol
+from ..Common.protocol import Protocol, Frame
 from ..Common.source import Source
+from ..Common import logs, languages, workspaces, processes
+from ..Common.usage import Usage
+from ..Common.profiles import Profile
+from .results import ResultCache
 import socket
 import asyncio
+import logging
+import os
+import shutil
+from pathlib import Path
 from uuid import uuid4
 from functools import partial
+from itertools import count
+from contextlib import nullcontext
+from collections import deque
+import codecs
+
+
+logger = logging.getLogger(__name__)
 
 
 async def subprocess(stdin: str) -> Tuple[bool, str]:
@@ -20,89 +36,246 @@ async def subprocess(stdin: str) -> Tuple[bool, str]:
         *stdin.split(" "), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
     stdout, stderr = await process.communicate()
     if not stdout:
-        print(f"failed with '{stdin}'")
+        logger.debug("failed with '%s'", stdin)
         return False, stderr.decode("utf-8")
-    print(f"succeeded with '{stdin}'")
+    logger.debug("succeeded with '%s'", stdin)
     return True, stdout.decode("utf-8")
 
 
-def setup_socket() -> socket.socket:
+Address = Union[Tuple[str, int], str]
+
+
+def setup_socket(address: Address) -> socket.socket:
     """
     sets up a socket used by the client.
 
     blocking must be false since used in async context.
+    :param address: the address that will be connected to, a path is a unix socket.
     :return: the clients socket used to connect to the processing server.
     """
-    sock = socket.socket()
+    sock = socket.socket(socket.AF_UNIX) if isinstance(address, str) else socket.socket()
     sock.setblocking(False)
     return sock
 
 
+class Worker:
+    """
+    a long lived docker container that processes many jobs before it is recycled.
+    """
+    def __init__(self, uuid: str, address: Address, slots: int) -> None:
+        """
+        :param uuid: id (name) of the container.
+        :param address: the address the server in the container listens on.
+        :param slots: how many jobs the container runs at once.
+
+        :attr uuid: id (name) of the container.
+        :attr address: the address the server in the container listens on.
+        :attr started: when the container was started, in loop time. None until it is ready for jobs.
+        :attr jobs: how many jobs that have been given to the container.
+        :attr active: how many jobs that are running in the container right now.
+        :attr slots: how many jobs the container runs at once, lowered if the server tells it is busy.
+        :attr failed: set when a job failed in the container, it gets no more jobs after that.
+        :attr retired: set once the container is being stopped.
+        """
+        self.uuid = uuid
+        self.address = address
+        self.started: Optional[float] = None
+        self.jobs = 0
+        self.active = 0
+        self.slots = slots
+        self.failed = False
+        self.retired = False
+
+
 class QueuedPool:
     """
     a processing pool with first in first out queue to entry.
 
     this functions acts as a bottle neck depending on the amount of ports available for
     this program specified with -p option when running main.py.
-
-    this pool will continuously look for processes that have been added to the internal queue
-    if there is a port available for a container to start the process it will be put in a pending state.
-    once the process is finished the port will be released and the process will be removed from its pending
-    state freeing up another spot for another process to be queued.
+    if a directory for unix sockets is given with the -u option the pool size is set with -n instead
+    and each container gets its own directory in there with the socket its server listens on.
+
+    the containers are workers that are kept running between jobs, each worker runs up to `slots` jobs at once.
+    a server that has to queue jobs because it has fewer cores than that tells so (see throttle)
+    and its worker gets no more jobs at once than the server processes.
+    this pool hands the processes added to the internal queue to a worker with a free slot as soon as there is one.
+    if there is none and there is a port available a new worker is started.
+    a worker is recycled (stopped and replaced when needed) after `max_jobs` jobs,
+    after `max_age` seconds or as soon as a job in it fails.
+    besides the workers that are busy the pool keeps idle workers started on standby so a burst of jobs
+    does not have to wait for docker. the size of that reserve follows the demand seen during the last
+    `window` seconds but is never less than `standby`.
+    every source runs in its own scratch directory on the server that is removed afterwards,
+    so nothing from one job is left for the next in the same worker.
     """
-    def __init__(self, start_port: int, end_port: int = None, loop: asyncio.AbstractEventLoop = None) -> None:
+    def __init__(self, start_port: int, end_port: int = None, loop: asyncio.AbstractEventLoop = None,
+                 release: Callable[[Address], Awaitable[None]] = None,
+                 sockets: str = None, size: int = None,
+                 slots: int = 1, max_jobs: int = 100, max_age: float = 600,
+                 prepare: Callable[[Address], Awaitable[None]] = None, standby: int = 0) -> None:
         """
         initializes the QueuedPool and starts trying to process the queue.
 
         the difference between start_port and end_port + 1 will be the size of the processing pool
         as that is the amount of ports freely availeble.
+        with unix sockets no ports are used and the size is given directly.
 
         :param start_port: start of the port range.
         :param end_port: end of the port range.
         :param loop: asyncio event loop.
+        :param release: called with the address of a container before the container is stopped.
+        :param sockets: directory to put the unix sockets of the containers in, ports are used if not given.
+        :param size: the size of the processing pool when unix sockets are used.
+        :param slots: how many jobs a single worker runs at once.
+        :param max_jobs: how many jobs a worker gets before its recycled.
+        :param max_age: how many seconds a worker is used before its recycled.
+        :param prepare: called with the address of a started container and returns once it accepts jobs.
+        :param standby: the least amount of idle workers to keep started.
 
         :attr loop: asyncio event loop.
         :attr start_port: start of the port range.
         :attr end_port: end of the port range.
-        :attr size: amount of ports availeble as well as the process pool size.
-        :attr used_ports: ports currently in use by docker containers.
+        :attr sockets: directory for the unix sockets of the containers, None if ports are used.
+        :attr size: amount of ports availeble as well as the maximum amount of workers.
+        :attr slots: how many jobs a single worker runs at once.
+        :attr max_jobs: how many jobs a worker gets before its recycled.
+        :attr max_age: how many seconds a worker is used before its recycled.
+        :attr ports: the ports not in use by docker containers.
         :attr used_ids: ids (names) of the currently running docker containers.
-        :attr queue: the queue waiting to get into the pending queue
+        :attr queue: the processes waiting for a worker, first in first out.
         :attr pending: currently run processes.
+        :attr workers: the running and starting workers mapped by id.
+        :attr free: the free slots of the started workers, a worker is in here once for every free slot it has.
+        :attr changed: set when something the pool waits for have changed, see wake.
+        :attr timer: wakes the pool when the next worker gets too old, see schedule_wake.
+        :attr backoff: how many seconds to wait before replacing a worker that could not be started.
+        :attr dispatcher: the task running _process_queue.
+        :attr incompatible: set once a container turned out to not speak the protocol of the client,
+            no more workers are started and every process fails with it.
+        :attr release: called with the address of a container before the container is stopped.
+        :attr prepare: called with the address of a started container and returns once it accepts jobs.
+        :attr standby: the least amount of idle workers to keep started.
+        :attr window: how many seconds back the demand is remembered.
+        :attr demand: the amount of workers needed at different times within the window, as (time, workers).
         """
         self.loop = loop
+        self.release = release
+        self.prepare = prepare
         self.start_port = start_port
         self.end_port = end_port if end_port else start_port
-        self.size = self.end_port - self.start_port + 1
+        self.sockets = Path(sockets).absolute() if sockets else None
+        self.size = size if self.sockets else self.end_port - self.start_port + 1
         assert self.start_port <= self.end_port
-
-        self.used_ports: Set[int] = set()
+        self.slots = slots
+        self.max_jobs = max_jobs
+        self.max_age = max_age
+        self.standby = standby
+        self.window = 60
+        self.demand: deque = deque()
+        assert self.size > 0
+        assert self.slots > 0
+
+        self.ports: asyncio.Queue = asyncio.Queue()
+        if not self.sockets:
+            for port in range(self.start_port, self.end_port + 1):
+                self.ports.put_nowait(port)
         self.used_ids: Set[str] = set()
-        self.queue: List[Tuple[asyncio.Future, Callable[[Tuple[str, int]], Awaitable[str]]]] = []
+        self.queue: Deque[Tuple[asyncio.Future, Callable[[Address], Awaitable[Any]]]] = deque()
         self.pending: Set[asyncio.Task] = set()
+        self.workers: Dict[str, Worker] = {}
+        self.free: Deque[Worker] = deque()
+        self.changed = asyncio.Event()
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.backoff = 1
+        self.incompatible: Optional[Errors.NotImplementedInProtocol] = None
 
-        self.loop.create_task(self._process_queue())
+        self.dispatcher = self.loop.create_task(self._process_queue())
+        self.dispatcher.add_done_callback(self.dispatcher_done)
 
-    @staticmethod
-    async def pass_gil() -> None:
+    def dispatcher_done(self, task: asyncio.Task) -> None:
+        """
+        called if _process_queue ever stops, nothing would be dispatched anymore so everything queued is failed.
+
+        :param task: the task running _process_queue.
+        :return: None
+        """
+        if task.cancelled():
+            return
+        error = task.exception() or RuntimeError("the pool stopped dispatching.")
+        logger.critical("the pool stopped dispatching jobs.", exc_info=error)
+        while self.queue:
+            future, _ = self.queue.popleft()
+            if not future.done():
+                future.set_exception(Errors.ContainerStartupError(f"the pool stopped dispatching: {error}"))
+
+    def fail_next(self, error: Exception) -> None:
         """
-        forces the task to sleep and pass the GIL to next task.
+        fails the next queued process that is still waiting, used when a worker could not be made or started
+        so a broken docker setup does not leave everything queued forever.
 
+        :param error: the exception the process raises.
         :return: None
         """
-        await asyncio.sleep(0.01)
+        while self.queue:
+            future, _ = self.queue.popleft()
+            if not future.done():
+                future.set_exception(error)
+                break
+
+    def wake(self) -> None:
+        """
+        wakes the loop in _process_queue, called whenever something it waits for have changed.
+
+        :return: None
+        """
+        self.changed.set()
+
+    def schedule_wake(self) -> None:
+        """
+        wakes the pool when the oldest worker reaches max_age so it is recycled even if nothing else happens.
+
+        :return: None
+        """
+        if self.timer:
+            self.timer.cancel()
+        deadlines = [worker.started + self.max_age for worker in self.workers.values()
+                     if worker.started is not None and not worker.retired]
+        self.timer = self.loop.call_at(min(deadlines), self.wake) if deadlines else None
 
     @staticmethod
-    async def start_container(uuid: str, port: int) -> None:
+    async def start_container(uuid: str, address: Address) -> None:
         """
-        starts a docker container with provided id and port.
+        starts a docker container with provided id and address.
 
-        :param port: local port to expose to the container.
+        for a tcp address the port is published to the container.
+        for a unix socket the directory of the socket is mounted in the container
+        and the server is told to listen on a socket in there.
+        the log level and output limit of the client is passed on to the server in the container.
+        the artifact cache of the server is a docker volume shared by all the containers,
+        only the server writes to it, the sources run as another user, see Codescord.Common.processes.sandbox.
+        the sources run in an in memory tmpfs, see Codescord.Common.workspaces.
+
+        :param address: local address to expose to the container.
         :param uuid: container id.
         :return: None
         """
-        success, stdout = await subprocess(
-            f"sudo docker run -d -p {port}:{6090} --name {uuid} codescord")
+        environment = " ".join(f"-e {variable}={os.environ[variable]}"
+                               for variable in (logs.variable, languages.output_variable,
+                                                languages.java_daemon_variable, languages.python_preload_variable,
+                                                languages.python_zygote_variable, processes.sandbox_variable)
+                               if variable in os.environ)
+        environment += (f" -v {languages.artifacts_volume}:{languages.container_artifacts}"
+                        f" -e {languages.artifacts_variable}={languages.container_artifacts}"
+                        f" --tmpfs {workspaces.container_workspaces}:rw,exec,size={workspaces.size}"
+                        f" -e {workspaces.variable}={workspaces.container_workspaces}")
+        if isinstance(address, str):
+            success, stdout = await subprocess(
+                f"sudo docker run -d {environment} -v {Path(address).parent}:{Net.container_sockets} "
+                f"--name {uuid} codescord python main.py server -u {Net.container_sockets}")
+        else:
+            success, stdout = await subprocess(
+                f"sudo docker run -d {environment} -p {address[1]}:{Net.port} --name {uuid} codescord")
         if not success:
             raise Errors.ContainerStartupError(stdout)
 
@@ -125,43 +298,62 @@ class QueuedPool:
         if not success:
             raise Errors.ContainerRmError(stdout)
 
-    async def schedule_process(self, process: Callable[[Tuple[str, int]], Awaitable[str]]) -> str:
+    async def schedule_process(self, process: Callable[[Address], Awaitable[Any]]) -> Any:
         """
-        main way to schedule a process. the process (coroutine) should ultimately return a string.
+        main way to schedule a process. the process (coroutine) should ultimately return the result.
 
         :param process: callable coroutine with partial args.
         :return: result from the process.
+        :raises Errors.ContainerStartupError: if the pool no longer dispatches jobs.
+        :raises Errors.NotImplementedInProtocol: if the containers do not speak the protocol of the client.
         """
+        if self.incompatible:
+            raise Errors.NotImplementedInProtocol(*self.incompatible.args)
+        if self.dispatcher.done():
+            raise Errors.ContainerStartupError("the pool stopped dispatching jobs.")
         future = self.loop.create_future()
         self.queue.append((future, process))
+        self.wake()
         await future
         return future.result()
 
     async def get_port(self) -> int:
         """
-        generates a free port for use.
+        takes a free port for use.
 
-        looks for a free port, if none availeble it waits for one to be free.
+        if none is availeble it waits for one to be freed with free_address.
 
         :return: port
         """
-        if self.end_port:
-            while True:
-                for port in range(self.start_port, self.end_port + 1):
-                    if port not in self.used_ports:
-                        self.used_ports.add(port)
-                        return port
-                await self.pass_gil()
+        return await self.ports.get()
+
+    async def get_address(self, uuid: str) -> Address:
+        """
+        generates a free address for a container.
+
+        with unix sockets a directory for the container is made to put its socket in,
+        otherwise a free port is used.
+
+        :param uuid: container id.
+        :return: the address to connect to the container on.
+        """
+        if self.sockets:
+            directory = self.sockets.joinpath(uuid)
+            directory.mkdir(parents=True)
+            return str(directory.joinpath(Net.socket_name))
+        return "localhost", await self.get_port()
+
+    def free_address(self, address: Address) -> None:
+        """
+        frees an address from get_address for further use.
+
+        :param address: address of a stopped container.
+        :return: None
+        """
+        if isinstance(address, str):
+            shutil.rmtree(Path(address).parent, ignore_errors=True)
         else:
-            port = self.start_port
-            while True:
-                if port not in self.used_ports:
-                    self.used_ports.add(port)
-                    return port
-                port += 1
-                if port > 0xFFFF:  # 65535 in hex, maximum amount of ports available
-                    port = self.start_port
-                await self.pass_gil()
+            self.ports.put_nowait(address[1])
 
     def get_id(self) -> str:
         """
@@ -175,70 +367,462 @@ class QueuedPool:
                 self.used_ids.add(uuid)
                 return uuid
 
+    def retiring(self, worker: Worker) -> bool:
+        """
+        checks if a worker should be recycled.
+
+        :param worker: a started worker.
+        :return: true if the worker failed, has had max_jobs jobs or is older than max_age.
+        """
+        return (worker.failed
+                or worker.jobs >= self.max_jobs
+                or self.loop.time() - worker.started >= self.max_age)
+
+    def get_worker(self) -> Optional[Worker]:
+        """
+        takes a free slot of a started worker that is not about to be recycled.
+
+        the most recently freed slot is taken first so the jobs are packed into as few workers as possible.
+        slots of workers that are recycled, about to be or have fewer slots since they were freed (see throttle)
+        are thrown away when they come up, a worker that gets no more jobs never gets its slots back.
+
+        :return: the worker or None if there is no such worker.
+        """
+        while self.free:
+            worker = self.free.pop()
+            if (self.workers.get(worker.uuid) is worker and not worker.retired
+                    and worker.active < worker.slots and not self.retiring(worker)):
+                return worker
+        return None
+
+    def throttle(self, address: Address, slots: int) -> None:
+        """
+        lowers the slots of a worker to what its server processes at once.
+
+        called when the server had to queue a job, see Codescord.Server.scheduler.Scheduler.
+
+        :param address: the address of the server that is busy.
+        :param slots: how many sources the server processes at once.
+        :return: None
+        """
+        for worker in self.workers.values():
+            if worker.address == address and slots < worker.slots:
+                logger.info("worker %s processes %s sources at once, lowering its slots from %s.",
+                            worker.uuid, slots, worker.slots)
+                worker.slots = max(slots, 1)
+
+    def reserve(self) -> int:
+        """
+        calculates how many idle workers to keep on standby.
+
+        the amount of workers needed right now is recorded every time this is called.
+        the reserve is the peak of that during the last self.window seconds minus what is needed right now,
+        so after a burst enough workers are kept around to take another burst of the same size at once.
+
+        :return: the amount of idle workers to keep started, at least self.standby.
+        """
+        now = self.loop.time()
+        active = sum(worker.active for worker in self.workers.values())
+        needed = -(-(active + len(self.queue)) // self.slots)
+        if not self.demand or self.demand[-1][1] != needed:
+            self.demand.append((now, needed))
+        while self.demand[0][0] < now - self.window and len(self.demand) > 1:
+            self.demand.popleft()
+        return max(self.standby, max(workers for _, workers in self.demand) - needed)
+
     async def _process_queue(self) -> None:
         """
         a forever running loop to put queued items up for execution once there is space in the queue.
 
         this loop is called in the init method
 
-        if there is a spot in the processing queue self.pending and there are processes queued
-        in self.queue an id and port is generated for a new process followed by execution of the process.
-        when the process is done some cleanup is done to free resources.
+        while there are processes queued in self.queue they are handed to workers with a free slot.
+        if no worker has a free slot and the slots of the workers that are starting are not enough for the queue
+        new workers are started as long as there is room for them in the pool.
+        the reserve of idle workers is refilled in the background, see self.reserve.
+        idle workers that should be recycled are stopped.
 
-        if there are no processes to add to the queue the gil will be passed onto some other task by sleeping here.
+        the loop then sleeps until it is woken by something it waits for, a queued process, a started worker,
+        a freed slot or a stopped worker (see wake) or by a worker getting too old (see schedule_wake).
+        a process is handed to a worker the moment a slot is free and an idle pool uses no cpu at all.
 
         :return: None
         """
         while True:
-            if len(self.pending) < self.size:
-                if self.queue:
-                    uuid = self.get_id()
-                    port = await self.get_port()
-                    process = asyncio.create_task(self.process(uuid, port))
-                    asyncio.create_task(self.cleanup(uuid, port, process))
-                    self.pending.add(process)
-            await self.pass_gil()
+            self.changed.clear()
+            while self.queue and self.queue[0][0].done():
+                # the caller gave up on the process while it was queued
+                self.queue.popleft()
+            while self.queue and (worker := self.get_worker()):
+                worker.jobs += 1
+                worker.active += 1
+                process = asyncio.create_task(self.process(worker, *self.queue.popleft()))
+                self.pending.add(process)
+                process.add_done_callback(self.pending.discard)
+
+            while self.incompatible is None and len(self.workers) < self.size:
+                starting = sum(worker.slots for worker in self.workers.values()
+                               if worker.started is None and not worker.retired)
+                idle = sum(1 for worker in self.workers.values()
+                           if not worker.retired and not worker.active
+                           and (worker.started is None or not self.retiring(worker)))
+                if len(self.queue) <= starting and idle >= self.reserve():
+                    break
+                uuid = self.get_id()
+                try:
+                    worker = Worker(uuid, await self.get_address(uuid), self.slots)
+                except Exception as e:
+                    logger.exception("could not make worker %s.", uuid)
+                    self.used_ids.discard(uuid)
+                    self.fail_next(Errors.ContainerStartupError(f"{type(e).__name__}: {e}"))
+                    # tried again after a while like a worker that could not be started
+                    self.loop.call_later(self.backoff, self.wake)
+                    break
+                self.workers[uuid] = worker
+                asyncio.create_task(self.start(worker))
+
+            for worker in list(self.workers.values()):
+                if worker.started is not None and not worker.retired and not worker.active and self.retiring(worker):
+                    worker.retired = True
+                    asyncio.create_task(self.cleanup(worker))
+            self.schedule_wake()
+            await self.changed.wait()
+
+    async def start(self, worker: Worker) -> None:
+        """
+        starts the docker container for a worker.
+
+        the worker is given jobs once self.prepare returns, that is once the server in the container
+        accepts connections, instead of after a fixed wait. its slots are then added to self.free.
+        if the container can not be started, whatever went wrong, the next queued process fails with the error
+        so a broken docker setup does not leave everything queued forever. an unexpected error is given to it as
+        an Errors.ContainerStartupError so it is answered like a container that did not start.
+        the worker is not replaced until self.backoff seconds later.
+        a container that does not speak the protocol of the client never will, so then no more workers
+        are started and everything queued fails with the Errors.NotImplementedInProtocol, see self.incompatible.
+
+        :param worker: the worker to start.
+        :return: None
+        """
+        try:
+            await self.start_container(worker.uuid, worker.address)
+            if self.prepare:
+                await self.prepare(worker.address)
+            else:
+                await asyncio.sleep(0.45)  # wait a little for the container to start
+        except Errors.NotImplementedInProtocol as e:
+            logger.critical("container %s does not speak the protocol of the client: %s", worker.uuid, e)
+            worker.retired = True
+            self.incompatible = e
+            while self.queue:
+                future, _ = self.queue.popleft()
+                if not future.done():
+                    future.set_exception(Errors.NotImplementedInProtocol(*e.args))
+            asyncio.create_task(self.cleanup(worker))
+            return
+        except Exception as e:
+            if isinstance(e, (Errors.ContainerStartupError, ConnectionError, FileNotFoundError)):
+                logger.error("container %s could not be started: %s", worker.uuid, e)
+            else:
+                logger.exception("container %s could not be started.", worker.uuid)
+                e = Errors.ContainerStartupError(f"{type(e).__name__}: {e}")
+            worker.retired = True
+            self.fail_next(e)
+            # the worker keeps its spot for a while so a broken docker setup is not retried over and over
+            await asyncio.sleep(self.backoff)
+            asyncio.create_task(self.cleanup(worker))
+            return
+        worker.started = self.loop.time()
+        self.free.extend([worker] * worker.slots)
+        self.wake()
+        logger.info("started worker %s.", worker.uuid)
+
+    async def process(self, worker: Worker, future: asyncio.Future,
+                      process: Callable[[Address], Awaitable[Any]]) -> None:
+        """
+        runs a process popped off the waiting queue in a worker.
 
-    async def process(self, uuid: str, port: int) -> None:
+        the result or the exception from the process is set on its future unless it was cancelled meanwhile.
+        an exception marks the worker as failed so it is recycled, the cancellation of the future does not.
+        the slot is given back to self.free afterwards.
+
+        :param worker: the started worker with a free slot.
+        :param future: the future of the process from schedule_process.
+        :param process: the process to run.
+
+        :return: None
         """
-        pops off the next process from the waiting queue to start processing.
+        try:
+            result = await process(worker.address)
+        except Exception as e:
+            if future.done():
+                logger.debug("job in worker %s failed after it was cancelled: %s", worker.uuid, e)
+            else:
+                logger.warning("job in worker %s failed: %s", worker.uuid, e)
+                worker.failed = True
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            worker.active -= 1
+            self.free.append(worker)
+            self.wake()
 
-        starts the docker container with given uuid and port and starts the process
-        of connecting to the server inside. waits for a little bit to let the container start.
-        once its done processing the result is set on the future objects so the process can continue in
-        cleanup.
+    async def cleanup(self, worker: Worker) -> None:
+        """
+        recycles a worker that is done.
 
-        :param uuid: uuid for the docker container.
-        :param port: port for the docker container.
+        releases the address so connections to it are closed, stops the docker container
+        and then frees the uuid and address for further use as well as a spot in the pool.
 
+        :param worker: an idle worker that should be recycled.
         :return: None
         """
-        future, process = self.queue.pop(0)
-        await self.start_container(uuid, port)
-        await asyncio.sleep(0.45)  # wait a little for the container to start
-        result = await process(("localhost", port))
+        logger.info("recycling worker %s after %s jobs.", worker.uuid, worker.jobs)
+        try:
+            if self.release:
+                await self.release(worker.address)
+            await self.stop_container(worker.uuid)
+        except (Errors.ContainerStopError, Errors.ContainerRmError) as e:
+            logger.warning("container %s could not be removed: %s", worker.uuid, e)
+        finally:
+            del self.workers[worker.uuid]
+            self.used_ids.remove(worker.uuid)
+            self.free_address(worker.address)
+            self.wake()
+
+
+class Session:
+    """
+    a connection to a Codescord.Server that can be shared by many requests at once.
+
+    once the framed protocol is negotiated every request gets its own request id and the session
+    keeps reading frames in the background, handing each frame to the request with the same id.
+    the server is free to answer the requests in any order.
+    a request can be answered with several frames when its output is streamed, every frame
+    except the last one then has the Frame.Flags.more flag set.
+
+    if the server only speaks the v1 protocol the session is just a wrapper around the connection
+    and is closed after a single use.
+
+    a server that is busy sends a queued frame for a request before its answer,
+    it is not handed to the request but to `throttle` so the pool can send the server fewer jobs.
+
+    :attr backlog: how many frames that can wait for a request before the session stops reading.
+    """
+    backlog = 16
+
+    def __init__(self, net: Net, connection: socket.socket, throttle: Callable[[int], None] = None) -> None:
+        """
+        :param net: the Net used to send and receive frames.
+        :param connection: the connected socket to the server.
+        :param throttle: called with how many sources the server processes at once when it is busy.
+
+        :attr net: the Net used to send and receive frames.
+        :attr connection: the connected socket to the server.
+        :attr framed: if the framed protocol was negotiated on the connection.
+        :attr closed: if the session have been closed, by either side.
+        :attr requests: generator of request ids.
+        :attr pending: queues of received frames for the requests still waiting for an answer mapped by request id.
+        :attr sending: held while sending so frames from concurrent requests are not interleaved.
+        :attr reader: the background task reading frames from the server.
+        :attr capabilities: the capabilities agreed on with the server, see Frame.Capabilities.
+        :attr serial: held by the request in flight when the server does not support multiplexing.
+        :attr throttle: called with how many sources the server processes at once when it is busy.
+        """
+        self.net = net
+        self.connection = connection
+        self.framed = False
+        self.closed = False
+        self.requests = count(1)
+        self.pending: Dict[int, asyncio.Queue] = {}
+        self.sending = asyncio.Lock()
+        self.reader: Optional[asyncio.Task] = None
+        self.capabilities = 0
+        self.serial = asyncio.Lock()
+        self.throttle = throttle
+
+    def start(self, capabilities: int) -> None:
+        """
+        starts reading frames, called once the framed protocol is negotiated.
+
+        :param capabilities: the capabilities agreed on with the server.
+        :return: None
+        """
+        self.framed = True
+        self.capabilities = capabilities
+        self.reader = self.net.loop.create_task(self.read())
+
+    def supports(self, capability: int) -> bool:
+        """
+        checks if a capability was agreed on with the server.
+
+        :param capability: one of the bits in Frame.Capabilities.
+        :return: true if both sides support the capability.
+        """
+        return bool(self.capabilities & capability)
+
+    def turn(self) -> AsyncContextManager:
+        """
+        waits for the turn of a request.
+
+        without multiplexing only one request can be in flight at a time so the requests take turns,
+        with multiplexing every request goes right away.
+
+        :return: the context to hold while the request is in flight.
+        """
+        return nullcontext() if self.supports(Frame.Capabilities.multiplexing) else self.serial
+
+    async def read(self) -> None:
+        """
+        reads frames from the server and hands them to the request they belong to.
+
+        if a request does not keep up with its frames the session stops reading from the connection
+        until it does, so a streamed output never piles up in memory.
+        a frame for request 0 is about the whole connection and can only be an error,
+        it fails all the pending requests.
+        a queued frame only tells that the server is busy and is handed to self.throttle.
+        whatever stops the reading, a lost connection or a frame that makes no sense,
+        closes the session and fails the pending requests so none of them waits forever.
+
+        :return: None
+        """
+        try:
+            while True:
+                frame_type, flags, request, payload = await self.net.receive_frame(self.connection)
+                if request == 0:
+                    self.fail(Errors.InternalServerError(frame_type))
+                elif frame_type == Frame.Type.queued:
+                    waiting, slots = Frame.backlog.unpack(payload)
+                    logger.debug("server is busy, %s sources waiting for %s slots.", waiting, slots)
+                    if self.throttle:
+                        self.throttle(slots)
+                elif queue := self.pending.get(request):
+                    await queue.put((frame_type, flags, payload))
+        except OSError as e:
+            self.fail(e)
+        except Exception as e:
+            logger.exception("session could not read from the server.")
+            self.fail(e)
+
+    def fail(self, error: Exception) -> None:
+        """
+        closes the session and fails all the pending requests with the error.
+
+        :param error: the exception the pending requests raises.
+        :return: None
+        """
+        self.closed = True
+        self.connection.close()
+        for queue in self.pending.values():
+            if queue.full():
+                # the request failed, the frame it have not got to yet does not matter anymore
+                queue.get_nowait()
+            queue.put_nowait(error)
+        self.pending.clear()
+
+    async def send(self, frame_type: int, payload: bytes, flags: int) -> Tuple[int, asyncio.Queue]:
+        """
+        sends a request with a new request id.
+
+        :param frame_type: one of the status codes in Protocol.Status or Frame.Type.
+        :param payload: the payload of the request.
+        :param flags: the flags of the request.
+
+        :raises ConnectionResetError: if the session is closed.
+
+        :return: the request id and the queue its answers are put in.
+        """
+        if self.closed:
+            raise ConnectionResetError("session is closed.")
+        request = next(self.requests)
+        queue = self.pending[request] = asyncio.Queue(self.backlog)
+        async with self.sending:
+            await self.net.send_frame(self.connection, frame_type, payload, flags, request, self.capabilities)
+        return request, queue
+
+    @staticmethod
+    async def receive(queue: asyncio.Queue) -> Tuple[int, int, bytearray]:
+        """
+        waits for the next frame of a request.
+
+        :param queue: the queue of the request from send.
+
+        :raises: the error the session failed with.
+
+        :return: the type, flags and payload of the frame.
+        """
+        frame = await queue.get()
+        if isinstance(frame, Exception):
+            raise frame
+        return frame
+
+    async def request(self, frame_type: int, payload: bytes = b"", flags: int = 0) -> Tuple[int, int, bytearray]:
+        """
+        sends a request and waits for the server to answer it.
 
-        future.set_result(result)
+        :param frame_type: one of the status codes in Protocol.Status or Frame.Type.
+        :param payload: the payload of the request.
+        :param flags: the flags of the request.
 
-    async def cleanup(self, uuid: str, port: int, process: asyncio.Task) -> None:
+        :raises ConnectionResetError: if the session is closed.
+
+        :return: the type, flags and payload of the answer.
+        """
+        async with self.turn():
+            request, queue = await self.send(frame_type, payload, flags)
+            try:
+                return await self.receive(queue)
+            finally:
+                self.pending.pop(request, None)
+
+    async def stream(self, frame_type: int, payload: bytes = b"",
+                     flags: int = 0) -> AsyncIterator[Tuple[int, int, bytearray]]:
         """
-        cleans up resource usage from the task whenever its done running.
+        sends a request and yields every frame the server answers it with.
+
+        stops after the first frame without the Frame.Flags.more flag.
 
-        waits for the process to finish as well as
-        the docker container to close before freeing the uuid, port for further use as well as
-        freeing a spot in the process pool of pending processes
+        :param frame_type: one of the status codes in Protocol.Status or Frame.Type.
+        :param payload: the payload of the request.
+        :param flags: the flags of the request.
+
+        :raises ConnectionResetError: if the session is closed.
+
+        :return: the type, flags and payload of each frame.
+        """
+        async with self.turn():
+            request, queue = await self.send(frame_type, payload, flags)
+            try:
+                while True:
+                    frame = await self.receive(queue)
+                    yield frame
+                    if not frame[1] & Frame.Flags.more:
+                        break
+            finally:
+                self.pending.pop(request, None)
+
+    async def close(self) -> None:
+        """
+        closes the session.
+
+        tells the server to close if the framed protocol was used.
+        the v1 protocol closes on its own in Client.handle_legacy.
 
-        :param uuid: container uuid
-        :param port: port that is/was used by the container
-        :param process: the process connecting into the docker container
         :return: None
         """
-        await process
-        freeing_port = asyncio.create_task(self.stop_container(uuid))
-        await freeing_port
-        self.used_ids.remove(uuid)
-        self.used_ports.remove(port)
-        self.pending.remove(process)
+        if self.closed:
+            return
+        if self.framed:
+            try:
+                async with self.sending:
+                    await self.net.send_frame(self.connection, Protocol.Status.close)
+            except OSError:
+                pass
+            self.reader.cancel()
+            logger.info("session closed, compression: %s", self.net.compression)
+        self.fail(ConnectionResetError("session is closed."))
 
 
 class Client(Net):
@@ -253,17 +837,45 @@ class Client(Net):
     send the source code to the server,
     receive the stdout from the server
     and then close the connection.
+
+    the client first tries to negotiate the framed v2 protocol with the server,
+    if the server is from an older image the v1 protocol is used instead.
+    a connection that uses the framed protocol is kept open as a Session and shared by every
+    request to the same server until the container is released by the pool.
     """
-    def __init__(self, start_port: int, end_port: Optional[int], loop: asyncio.AbstractEventLoop = None) -> None:
+    def __init__(self, start_port: int, end_port: Optional[int], loop: asyncio.AbstractEventLoop = None,
+                 sockets: str = None, size: int = None,
+                 slots: int = 1, max_jobs: int = 100, max_age: float = 600, standby: int = 0,
+                 results: str = None, ttl: float = 86400) -> None:
         """
 
         :param start_port: start of the port range
         :param end_port: end of the port range
         :param loop: asyncio event loop
+        :param sockets: directory for unix sockets to the containers, ports are used if not given.
+        :param size: the pool size when unix sockets are used.
+        :param slots: how many jobs a single container runs at once.
+        :param max_jobs: how many jobs a container gets before its recycled.
+        :param max_age: how many seconds a container is used before its recycled.
+        :param standby: the least amount of idle containers to keep started.
+        :param results: sqlite database file to cache deterministic results in, nothing is cached if not given.
+        :param ttl: how many seconds a cached result is kept.
+
+        :attr pool: the pool of docker containers the sources are processed in.
+        :attr retries: how many times to reconnect if the connection is aborted.
+        :attr connect_attempts: how many times to try to connect to a server that is not listening (yet).
+        :attr sessions: open sessions using the framed protocol mapped by address.
+        :attr connecting: held while connecting to an address so only one session is opened per address.
+        :attr results: the cache of deterministic results, None if results are not cached.
         """
         super(Client, self).__init__(loop)
-        self.pool = QueuedPool(start_port, end_port, loop)
+        self.pool = QueuedPool(start_port, end_port, loop, self.close_session, sockets, size,
+                               slots, max_jobs, max_age, prepare=self.connect, standby=standby)
         self.retries = 5
+        self.connect_attempts = 50
+        self.sessions: Dict[Address, Session] = {}
+        self.connecting: Dict[Address, asyncio.Lock] = {}
+        self.results = ResultCache(results, ttl) if results else None
 
     async def authenticate(self, connection: socket.socket) -> None:
         """
@@ -276,13 +888,230 @@ class Client(Net):
 
         :return: None
         """
-        print("authenticating...")
+        logger.debug("authenticating...")
         await self.send_int_as_bytes(connection, Protocol.Status.authenticate)
         await self.assert_response_status(connection)
 
         payload = Protocol.get_protocol().encode("utf-8")
         await self.upload(connection, payload)
-        print("authenticated.")
+        logger.debug("authenticated.")
+
+    async def negotiate(self, connection: socket.socket) -> Optional[int]:
+        """
+        attempts to switch the connection over to the framed v2 protocol.
+
+        sends Frame.negotiate as a v1 instruction. a server that does not know about the framed protocol
+        answers with not implemented and keeps waiting for v1 instructions.
+        a server that does answers with success followed by its fingerprint and capabilities.
+        the client keeps the capabilities both sides have and sends them back with its own fingerprint
+        without waiting for an answer.
+
+        :param connection: the connection to the processing server.
+
+        :raises Errors.NotImplementedInProtocol: the servers fingerprint is not the same as the clients.
+
+        :return: the agreed capabilities if the server switched to the framed protocol else None.
+        """
+        logger.debug("negotiating protocol...")
+        await self.send_int_as_bytes(connection, Frame.negotiate)
+        try:
+            await self.assert_response_status(connection, Protocol.Status.success)
+        except Errors.NotImplementedByRecipient:
+            logger.info("server does not support framing, using protocol v1.")
+            return None
+
+        frame_type, _, _, payload = await self.receive_frame(connection)
+        self.raise_for_status(frame_type, Protocol.Status.authenticate)
+        fingerprint, version, capabilities = Frame.unpack_handshake(payload)
+        if fingerprint != Frame.fingerprint or version != Frame.version:
+            raise Errors.NotImplementedInProtocol(f"fingerprint {fingerprint} v{version}")
+
+        capabilities &= Frame.capabilities
+        await self.send_frame(connection, Protocol.Status.authenticate, Frame.pack_handshake(capabilities))
+        logger.debug("using protocol v%s with capabilities %s.", Frame.version, capabilities)
+        return capabilities
+
+    @staticmethod
+    def pack_source(source: Source) -> bytes:
+        """
+        packs a source into the payload of a file frame.
+
+        :param source: source object with language and source code.
+        :return: the packed language, code and sys args.
+        """
+        return Frame.pack_fields(
+            source.language.encode("utf-8"),
+            source.code.encode("utf-8"),
+            source.sys_args.encode("utf-8"))
+
+    @staticmethod
+    def account(session: Session, source: Source, fields: List[bytes]) -> Optional[Profile]:
+        """
+        logs what processing a source cost the server and the limits it ran under, if the server told.
+
+        the cost is logged as fields so it can be summed up per language for capacity planning.
+
+        :param session: the session the source was processed on.
+        :param source: the processed source.
+        :param fields: the fields the server sent after the output, see Codescord.Server.server.Server.result_fields.
+        :return: the limits the source ran under if the server told.
+        """
+        fields = iter(fields)
+        usage = Usage.unpack(next(fields)) if session.supports(Frame.Capabilities.usage) else None
+        profile = Profile.unpack(next(fields)) if session.supports(Frame.Capabilities.limits) else None
+        if usage:
+            logger.info("processed %s source, %s.", source.language, usage,
+                        extra={"language": source.language, **vars(usage)})
+        if profile:
+            logger.debug("%s source ran with %s.", source.language, profile)
+        return profile
+
+    @classmethod
+    def unpack_result(cls, session: Session, source: Source, flags: int,
+                      payload: bytes) -> Tuple[bytes, Optional[Profile]]:
+        """
+        takes the output out of the frame with the result of a source.
+
+        :param session: the session the source was processed on.
+        :param source: the processed source.
+        :param flags: the flags of the frame.
+        :param payload: the payload of the frame.
+        :return: the output and the limits the source ran under if the server told, see account.
+        """
+        if not flags & Frame.Flags.usage:
+            return payload, None
+        output, *fields = Frame.unpack_fields(payload)
+        return output, cls.account(session, source, fields)
+
+    @staticmethod
+    def describe(source: Source, status: int, output: bytes, profile: Profile = None) -> str:
+        """
+        turns the status and output of a processed source into the text given back to the user.
+
+        :param source: the source that was processed.
+        :param status: the status the server answered with for the source.
+        :param output: the output from the server, the stage that timed out for a timeout.
+        :param profile: the limits the source ran under, the timeout is told with these if given.
+
+        :raises: the errors from Net.raise_for_status if the status is not the result of a processed source.
+
+        :return: the result from processing.
+        """
+        if status == Protocol.Status.process_timeout:
+            if profile and output == b"compile":
+                logger.debug("compilation took longer than %ss.", profile.compile_timeout)
+                return (f"Process took longer then {profile.compile_timeout:g}s to compile. "
+                        f"Process was killed and did not finish.")
+            timeout = profile.run_timeout if profile else Protocol.timeout
+            logger.debug("process took longer than %ss.", timeout)
+            return f"Process took longer then {timeout:g}s. Process was killed and did not finish."
+        elif status == Protocol.Status.not_implemented:
+            logger.debug("%s was not implemented on the server.", source.language)
+            return f"No execution procedure for language '{source.language}'."
+        Net.raise_for_status(status, Protocol.Status.text)
+        return output.decode("utf-8")
+
+    async def download_stdout(self, session: Session, source: Source) -> AsyncIterator[str]:
+        """
+        sends a source to be processed and yields its output while it is running.
+
+        the output is decoded as it arrives, a character split between two frames is held back until
+        the rest of it arrives. if the source times out the output produced before the timeout
+        is yielded followed by the timeout message.
+        the session stops reading from the server while the consumer of this iterator is busy,
+        so neither side holds more than a few frames of output in memory.
+
+        :param session: a session using the framed protocol.
+        :param source: source object with language and source code.
+
+        :return: the output from the processing server.
+        """
+        logger.debug("handling stdout...")
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        last = "\n"
+        async for frame_type, flags, payload in session.stream(
+                Protocol.Status.file, self.pack_source(source), Frame.Flags.stream):
+            payload, profile = self.unpack_result(session, source, flags, payload)
+            if frame_type == Protocol.Status.text:
+                if output := decoder.decode(payload, not flags & Frame.Flags.more):
+                    last = output[-1]
+                    yield output
+            else:
+                output = decoder.decode(b"", True) + self.describe(source, frame_type, payload, profile)
+                yield output if last == "\n" else f"\n{output}"
+        logger.debug("stdout handled.")
+
+    async def request_batch(self, session: Session, sources: List[Source]) -> List[str]:
+        """
+        the framed counterpart to handle_legacy.
+
+        a single source has its output streamed with download_stdout, several sources are sent together
+        in a batch request so the server can process them all at once.
+        other requests can be in flight on the same session.
+        if the server does not support streaming or batching the sources are sent in plain file requests.
+
+        :param session: a session using the framed protocol.
+        :param sources: source objects with language and source code.
+
+        :return: the results from the processing server in the same order as the sources.
+        """
+        if len(sources) > 1 and not session.supports(Frame.Capabilities.batching):
+            results = await asyncio.gather(*(self.request_batch(session, [source]) for source in sources))
+            return [result for result, in results]
+        if len(sources) == 1 and session.supports(Frame.Capabilities.streaming):
+            return ["".join([output async for output in self.download_stdout(session, sources[0])])]
+        if len(sources) == 1:
+            frame_type, flags, payload = await session.request(Protocol.Status.file, self.pack_source(sources[0]))
+            return [self.describe(sources[0], frame_type, *self.unpack_result(session, sources[0], flags, payload))]
+
+        frame_type, _, payload = await session.request(Frame.Type.batch, Frame.pack_fields(
+            *(self.pack_source(source) for source in sources)))
+        self.raise_for_status(frame_type, Frame.Type.batch)
+        results = []
+        for source, result in zip(sources, Frame.unpack_fields(payload)):
+            status, output, *fields = Frame.unpack_fields(result)
+            results.append(self.describe(source, status[0], output, self.account(session, source, fields)))
+        return results
+
+    async def handle_legacy(self, connection: socket.socket, sources: List[Source]) -> List[str]:
+        """
+        processes the sources one after another with the v1 protocol.
+
+        used when the server is from an older image and did not accept the framed protocol.
+        a v1 server closes the connection when a source times out or the language is not implemented,
+        the results for the remaining sources are then left out.
+
+        :param connection: the connection to the processing server.
+        :param sources: source objects with language and source code.
+
+        :raises Errors.NotImplementedInProtocol: the server did not accept the protocol.
+
+        :return: the results from the processing server in the same order as the sources.
+        """
+        try:
+            await self.authenticate(connection)
+        except Errors.NotImplementedByRecipient:
+            raise Errors.NotImplementedInProtocol("protocol")
+
+        results = []
+        for source in sources:
+            try:
+                await self.upload_source(connection, source)
+
+                await self.send_int_as_bytes(connection, Protocol.Status.awaiting)
+                results.append(await self.download_legacy_stdout(connection))
+                await self.assert_response_status(connection, Protocol.Status.awaiting)
+            except Errors.ProcessTimedOut:
+                results.append(self.describe(source, Protocol.Status.process_timeout, b""))
+                return results
+            except Errors.NotImplementedByRecipient:
+                results.append(self.describe(source, Protocol.Status.not_implemented, b""))
+                return results
+
+        logger.debug("client starting to send close")
+        await self.send_int_as_bytes(connection, Protocol.Status.close)
+        await self.assert_response_status(connection, Protocol.Status.success)
+        return results
 
     async def upload_source(self, connection: socket.socket, source: Source) -> None:
         """
@@ -294,86 +1123,146 @@ class Client(Net):
         :param source: source object with language and source code.
         :return: None
         """
-        print("handling the source...")
+        logger.debug("handling the source...")
         await self.send_int_as_bytes(connection, Protocol.Status.file)
         await self.assert_response_status(connection, Protocol.Status.success)
 
-        print(source)
-        print("uploading the language payload...")
+        logger.debug("uploading the language payload...")
         payload = source.language.encode("utf-8")
         await self.upload(connection, payload)
-        print("uploaded the language payload.")
+        logger.debug("uploaded the language payload.")
 
-        print("uploading the code payload...")
+        logger.debug("uploading the code payload...")
         payload = source.code.encode("utf-8")
         await self.upload(connection, payload)
-        print("uploaded the code payload.")
+        logger.debug("uploaded the code payload.")
 
-        print()
         payload = source.sys_args.encode("utf-8")
         await self.upload(connection, payload)
-        print("source handled.")
+        logger.debug("source handled.")
 
-    async def download_stdout(self, connection: socket.socket) -> str:
+    async def download_legacy_stdout(self, connection: socket.socket) -> str:
         """
-        handles the receiving of the stdout from the server when processing the source file.
+        handles the receiving of the stdout from the server when processing the source file with protocol v1.
 
         awaits the server to respond with a message if message is a text message the
         source files produced stdout will be downloaded from the processing server.
 
         :return: stdout from the processing server.
         """
-        print("handling stdout...")
+        logger.debug("handling stdout...")
         await self.assert_response_status(connection, Protocol.Status.text)
         await self.send_int_as_bytes(connection, Protocol.Status.success)
 
         blob = await self.download(connection)
         await self.send_int_as_bytes(connection, Protocol.Status.success)
 
-        print("stdout handled.")
+        logger.debug("stdout handled.")
         return blob.decode("utf-8")
 
-    async def handle_connection(self, connection: socket.socket, source: Source) -> str:
+    async def open_session(self, address: Address) -> Session:
         """
-        the main procedure of the processing of the source.
+        connects to the processing server and negotiates the protocol.
 
-        makes sure the client and server authenticates before proceeding.
-        sends the source to the processing server.
-        waits for the processing server to send results back, times out after 30 seconds.
-        downloads the results and returns them.
+        :param address: ip address with port or unix socket path to connect to.
 
-        :param connection: the connection to the processing server.
-        :param source: source object with language and source code.
+        :raises Errors.NotImplementedInProtocol: the server did not accept the protocol.
+
+        :return: the session to the processing server.
+        """
+        connection = setup_socket(address)
+        try:
+            logger.debug("connecting to %s...", address)
+            await self.loop.sock_connect(connection, address)
+            logger.debug("connected to %s.", address)
+            session = Session(self, connection, partial(self.pool.throttle, address))
+            if (capabilities := await self.negotiate(connection)) is not None:
+                session.start(capabilities)
+            return session
+        except BaseException:
+            connection.close()
+            raise
+
+    async def get_session(self, address: Address) -> Session:
+        """
+        gets the open session to an address or opens a new one.
+
+        only sessions using the framed protocol are kept and shared,
+        a session using the v1 protocol is only used once.
+
+        :param address: ip address with port or unix socket path to connect to.
+        :return: the session to the processing server.
+        """
+        async with self.connecting.setdefault(address, asyncio.Lock()):
+            if (session := self.sessions.get(address)) and not session.closed:
+                return session
+            session = await self.open_session(address)
+            if session.framed:
+                self.sessions[address] = session
+            return session
+
+    async def connect(self, address: Address, attempts=0) -> None:
+        """
+        waits for the server at an address to accept connections.
+
+        used by the pool to know when a container is ready for jobs.
+        a framed session is kept open for the first job, a v1 connection is closed again.
+
+        :param address: ip address with port or unix socket path to connect to.
+        :param attempts: how many attempts of connecting that have been done (max limit in self.connect_attempts).
+
+        :raises ConnectionError: if the server did not accept connections after all attempts.
+        :raises FileNotFoundError: if the unix socket of the server never showed up.
+        :raises Errors.NotImplementedInProtocol: if the server does not speak the protocol of the client.
 
         :return: None
         """
-        print("handling the connection...")
         try:
-            await self.authenticate(connection)
-            await self.upload_source(connection, source)
+            session = await self.get_session(address)
+        except (ConnectionRefusedError, ConnectionResetError, FileNotFoundError):
+            if attempts < self.connect_attempts:
+                await asyncio.sleep(0.1)
+                return await self.connect(address, attempts + 1)
+            raise
+        if not session.framed:
+            await self.send_int_as_bytes(session.connection, Protocol.Status.close)
+            await session.close()
 
-            await self.send_int_as_bytes(connection, Protocol.Status.awaiting)
-            stdout = await self.download_stdout(connection)
-            await self.assert_response_status(connection, Protocol.Status.awaiting)
+    async def close_session(self, address: Address) -> None:
+        """
+        closes the shared session to an address if there is one.
 
-            print("client starting to send close")
-            await self.send_int_as_bytes(connection, Protocol.Status.close)
-            await self.assert_response_status(connection, Protocol.Status.success)
+        :param address: ip address with port or unix socket path of the session.
+        :return: None
+        """
+        self.connecting.pop(address, None)
+        if session := self.sessions.pop(address, None):
+            await session.close()
 
-            print("connection handled.")
-            return stdout
-        # TODO add Protocol message and error handling for language not implemented
-        except Errors.ProcessTimedOut:
-            print(f"process took longer than {Protocol.timeout}s.")
-            return f"Process took longer then {Protocol.timeout}s. Process was killed and did not finish."
-        except Errors.NotImplementedByRecipient as e:
-            print(f"{e} was not implemented on the server.")
-            return f"No execution procedure for language '{source.language}'."
-        except Errors.NotImplementedInProtocol as e:
-            print(f"{e} is not implemented in the servers protocol.")
-            return f"Fatal error: {e}. Contact developer at mail@eliaseriksson.eu"
-        finally:
-            connection.close()
+    async def handle_connection(self, session: Session, sources: List[Source]) -> List[str]:
+        """
+        the main procedure of the processing of the sources.
+
+        sends the sources to the processing server.
+        waits for the processing server to send results back, times out after 30 seconds.
+        downloads the results and returns them.
+        a session with the v1 protocol is closed afterwards, a framed session stays open.
+
+        :param session: a session from get_session.
+        :param sources: source objects with language and source code.
+
+        :return: the results in the same order as the sources, might be shorter than sources with protocol v1.
+        """
+        logger.debug("handling the connection...")
+        if session.framed:
+            results = await self.request_batch(session, sources)
+        else:
+            try:
+                results = await self.handle_legacy(session.connection, sources)
+            finally:
+                await session.close()
+        logger.debug("connection handled.")
+        return results
 
     async def schedule_process(self, source: Source) -> str:
         """
@@ -382,46 +1271,116 @@ class Client(Net):
         :param source: source code to send.
         :return: the result from processing.
         """
-        process = partial(self.process, source)
-        return await self.pool.schedule_process(process)
+        return (await self.schedule_batch([source]))[0]
+
+    async def schedule_batch(self, sources: List[Source]) -> List[str]:
+        """
+        schedules several sources to be processed together in the same docker container.
+
+        all the sources share a single container and connection instead of one each.
+        if results are cached the sources with a cached result are answered without using the pool at all,
+        see ResultCache for which results are cached.
 
-    async def process(self, source: Source, address: Tuple[str, int], attempts=0) -> str:
+        :param sources: source codes to send.
+        :return: the results from processing in the same order as the sources.
         """
-        processes a source object on the processing server.
+        if not self.results:
+            return await self.schedule_pool(sources)
+
+        cached = await asyncio.gather(*(self.results.get(source) for source in sources))
+        missing = [source for source, result in zip(sources, cached) if result is None]
+        if not missing:
+            return cached
+        processed = await self.schedule_pool(missing)
+        await asyncio.gather(*(self.results.put(source, result) for source, result in zip(missing, processed)))
+        processed = iter(processed)
+        return [next(processed) if result is None else result for result in cached]
+
+    async def schedule_pool(self, sources: List[Source]) -> List[str]:
+        """
+        schedules sources to be processed together in a container from the pool.
+
+        a server that fails a whole connection fails every request on it, not only the one that made it fail,
+        so the sources are answered with an error message instead of the error reaching the caller.
+        so are sources that no container can process as it does not speak the protocol of the client.
 
-        can, but should not be called outside of schedule_process as it sets everything automatically
+        :param sources: source codes to send.
+        :return: the results from processing in the same order as the sources.
+        """
+        process = partial(self.process_batch, sources)
+        try:
+            return await self.pool.schedule_process(process)
+        except (ConnectionError, FileNotFoundError, Errors.ContainerStartupError):
+            return [f"Processing server down. Please try again later."] * len(sources)
+        except Errors.InternalServerError:
+            return [f"Processing server failed. Please try again later."] * len(sources)
+        except Errors.NotImplementedInProtocol as e:
+            logger.error("%s is not implemented in the servers protocol.", e)
+            return [f"Fatal error: {e}. Contact developer at mail@eliaseriksson.eu"] * len(sources)
 
-        starts the process of sending over the source object to the server to process
-        and receiving the result back from stdout.
+    async def process(self, source: Source, address: Address) -> str:
+        """
+        processes a single source object on the processing server.
 
         :param source: source object with language and source code.
-        :param attempts: how many attempts of reconnecting that have been done (max limit in self.retries).
-        :param address: ip address with port to connect to.
+        :param address: ip address with port or unix socket path to connect to.
 
         :return: the result from processing.
         """
+        return (await self.process_batch([source], address))[0]
+
+    async def process_batch(self, sources: List[Source], address: Address, attempts=0) -> List[str]:
+        """
+        processes source objects on the processing server.
+
+        can, but should not be called outside of schedule_batch as it sets everything automatically
+
+        starts the process of sending over the source objects to the server to process
+        and receiving the results back from stdout.
+
+        :param sources: source objects with language and source code.
+        :param attempts: how many attempts of reconnecting that have been done (max limit in self.retries).
+        :param address: ip address with port or unix socket path to connect to.
+
+        only connecting is retried, once the sources are sent a lost connection is not,
+        running them again could take the server down again.
+
+        :raises ConnectionError: if the server could not be reached after all attempts or the connection was lost.
+        :raises FileNotFoundError: if the unix socket of the server never showed up.
+
+        :return: the results from processing in the same order as the sources.
+        """
 
-        connection = setup_socket()
+        session = None
         try:
-            print(f"connecting to {address}...")
-            await self.loop.sock_connect(connection, address)
-            print(f"connected to {address}.")
-            stdout = await self.handle_connection(connection, source)
-            return stdout
+            while session is None:
+                try:
+                    session = await self.get_session(address)
+                except (ConnectionRefusedError, ConnectionResetError, FileNotFoundError):
+                    if attempts >= self.connect_attempts:
+                        raise
+                    logger.debug("server have probably not started yet, retrying...")
+                    attempts += 1
+                    await asyncio.sleep(0.1)
+            results = await self.handle_connection(session, sources)
+            if len(results) < len(sources):
+                # a v1 server closes the connection after a failed source, the rest needs a new connection
+                results += await self.process_batch(sources[len(results):], address)
+            return results
+        except Errors.NotImplementedInProtocol as e:
+            logger.error("%s is not implemented in the servers protocol.", e)
+            return [f"Fatal error: {e}. Contact developer at mail@eliaseriksson.eu"] * len(sources)
         except KeyboardInterrupt:
-            print(self.loop.is_closed())
-        except (ConnectionRefusedError, ConnectionResetError):
-            if attempts == 0:
-                print("server have probably not started yet, retrying...")
-                await asyncio.sleep(0.1)
-                return await self.process(source, address, attempts + 1)
-            else:
-                return await self.process(source, address, attempts + 1)
+            logger.debug("interrupted, loop closed: %s", self.loop.is_closed())
+        except ConnectionResetError as e:
+            if session is not None:
+                logger.warning("connection to %s was lost while processing: %s", address, e)
+                await self.close_session(address)
+            raise
         except (ConnectionAbortedError, BrokenPipeError) as e:
-            connection.close()
+            await self.close_session(address)
             if attempts < self.retries:
-                print(e)
-                print(f"connection was refused retrying with attempts number {attempts}.")
+                logger.warning("connection failed (%s) retrying with attempts number %s.", e, attempts)
                 await asyncio.sleep(0.5)
-                return await self.process(source, address, attempts + 1)
-            return f"Processing server down. Please try again later."
+                return await self.process_batch(sources, address, attempts + 1)
+            raise
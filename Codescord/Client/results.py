@@ -0,0 +1,209 @@
+from typing import Any, Callable, Optional, Union
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from ..Common.source import Source
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    an on disk cache of results for sources that give the same output every time they run.
+
+    a result is only served from the cache once it is known to be deterministic.
+    sources that mention something nondeterministic (time, randomness, threads, input etc) are never cached.
+    the first result for any other source is only kept as a candidate, if the same source later gives the
+    same result again the result is verified and served from then on. if it gives another result the source is
+    marked as volatile and is not cached at all. this way admitting a result never costs an extra run.
+
+    entries live for `ttl` seconds and the least recently used ones are removed when the results
+    take up more than `limit` bytes.
+
+    the database is only used from a thread of its own so the event loop of the bot never waits for the disk.
+
+    :attr candidate: state of a result seen once.
+    :attr verified: state of a result seen twice, served from the cache.
+    :attr volatile: state of a source that gave different results.
+    :attr nondeterministic: matches sources that should not be cached at all.
+    :attr failures: matches a line of a result that says that the source was never run to the end,
+        a source that timed out has its output before the timeout message.
+    """
+    candidate = 0
+    verified = 1
+    volatile = -1
+    nondeterministic = re.compile(
+        r"random|rand\(|uuid|guid|time|date|clock|now\(|nano|milli|stopwatch|thread|async|go\s+func|chan\b"
+        r"|pid|environ|getenv|hash|id\(|set\(|input|stdin|scanner|readline|read\(|open\(|socket|http|fetch",
+        re.IGNORECASE)
+    failures = re.compile(r"^(?:Process took longer then|Processing server down|Fatal error:)"
+                          r"|^\.\.\. output truncated after \d+ bytes\.$", re.MULTILINE)
+
+    def __init__(self, path: Union[Path, str], ttl: float = 86400, limit: int = 1 << 26) -> None:
+        """
+        opens or creates the cache.
+
+        :param path: the sqlite database file.
+        :param ttl: how many seconds a result is kept.
+        :param limit: the most bytes the results may take up.
+
+        :attr ttl: how many seconds a result is kept.
+        :attr limit: the most bytes the results may take up.
+        :attr executor: the thread the database is used from, the queries run one at a time in order.
+        :attr database: the connection to the sqlite database, None until it is opened in the thread.
+        :attr hits: how many results that were served from the cache.
+        :attr misses: how many sources that had to be processed.
+        """
+        self.ttl = ttl
+        self.limit = limit
+        self.hits = 0
+        self.misses = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="results")
+        self.database: Optional[sqlite3.Connection] = None
+        # the queries are queued behind this so they never run before the database is opened
+        self.executor.submit(self.open, path)
+
+    def open(self, path: Union[Path, str]) -> None:
+        """
+        opens or creates the database, in the thread of the cache.
+
+        :param path: the sqlite database file.
+        :return: None
+        """
+        self.database = sqlite3.connect(path)
+        self.database.execute("PRAGMA journal_mode=WAL")
+        self.database.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, result TEXT NOT NULL, state INTEGER NOT NULL, "
+            "created REAL NOT NULL, used REAL NOT NULL, size INTEGER NOT NULL)")
+        self.database.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        self.database.commit()
+
+    @staticmethod
+    def key(source: Source) -> str:
+        """
+        hashes everything that decides the result of a source.
+
+        :param source: the source.
+        :return: the sha256 hex digest of the language, code and sys args.
+        """
+        digest = hashlib.sha256()
+        for part in (source.language, source.code, source.sys_args):
+            part = part.encode("utf-8")
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    async def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        """
+        runs a function using the database in the thread of the cache.
+
+        :param function: the function to run.
+        :param args: the arguments to the function.
+        :return: what the function returned.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def get(self, source: Source) -> Optional[str]:
+        """
+        looks up the verified result of a source.
+
+        :param source: the source about to be processed.
+        :return: the result if its cached else None.
+        """
+        key = self.key(source)
+        result = await self.run(self.lookup, key, time.time())
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        logger.debug("result for %s served from the cache.", key)
+        return result
+
+    def lookup(self, key: str, now: float) -> Optional[str]:
+        """
+        looks up a verified result and marks it as used, in the thread of the cache.
+
+        :param key: the key of the source.
+        :param now: the current time.
+        :return: the result if its cached else None.
+        """
+        row = self.database.execute(
+            "SELECT result FROM results WHERE key = ? AND state = ? AND created > ?",
+            (key, self.verified, now - self.ttl)).fetchone()
+        if row is None:
+            return None
+        self.database.execute("UPDATE results SET used = ? WHERE key = ?", (now, key))
+        self.database.commit()
+        return row[0]
+
+    async def put(self, source: Source, result: str) -> None:
+        """
+        offers the result of a processed source to the cache.
+
+        :param source: the processed source.
+        :param result: the result from processing the source.
+        :return: None
+        """
+        if self.nondeterministic.search(source.code) or self.failures.search(result):
+            return
+        await self.run(self.admit, self.key(source), result, time.time())
+
+    def admit(self, key: str, result: str, now: float) -> None:
+        """
+        keeps a result as a candidate or verifies the candidate, in the thread of the cache.
+
+        :param key: the key of the processed source.
+        :param result: the result from processing the source.
+        :param now: the current time.
+        :return: None
+        """
+        row = self.database.execute(
+            "SELECT result, state FROM results WHERE key = ? AND created > ?", (key, now - self.ttl)).fetchone()
+        if row is None:
+            state = self.candidate
+        elif row[1] == self.candidate:
+            state = self.verified if row[0] == result else self.volatile
+        else:
+            return
+        self.database.execute(
+            "INSERT OR REPLACE INTO results (key, result, state, created, used, size) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, result, state, now, now, len(key) + len(result.encode("utf-8"))))
+        self.evict(now)
+        self.database.commit()
+
+    def evict(self, now: float) -> None:
+        """
+        removes expired results and then the least recently used ones until the results fit in self.limit,
+        in the thread of the cache.
+
+        :param now: the current time.
+        :return: None
+        """
+        self.database.execute("DELETE FROM results WHERE created <= ?", (now - self.ttl,))
+        size, = self.database.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()
+        if size <= self.limit:
+            return
+        for key, entry in self.database.execute("SELECT key, size FROM results ORDER BY used").fetchall():
+            self.database.execute("DELETE FROM results WHERE key = ?", (key,))
+            size -= entry
+            if size <= self.limit:
+                break
+
+    def close(self) -> None:
+        """
+        closes the database once the queries already queued are done.
+
+        :return: None
+        """
+        self.executor.submit(lambda: self.database and self.database.close())
+        self.executor.shutdown(wait=True)
+
+    def __str__(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses"
@@ -1 +1,2 @@
-__all__ = ["errors", "languages", "protocol", "source", "net"]
+__all__ = ["errors", "languages", "protocol", "source", "net", "compression", "logs", "artifacts", "workspaces",
+           "processes", "usage", "profiles", "zygote"]
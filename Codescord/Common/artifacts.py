@@ -0,0 +1,229 @@
+from typing import Optional, Union
+from pathlib import Path
+from uuid import uuid4
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import stat
+
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactCache:
+    """
+    a content addressed cache for compiled programs.
+
+    the key of an artifact is a hash of everything that decides what the compiler produces,
+    the language, the version of the toolchain, the compiler flags and the source.
+    an artifact is a single file (an executable) or a directory (class files) stored under its key.
+    the directory is meant to be a volume shared by the containers so it outlives them.
+    when the artifacts take up more than `limit` bytes the least recently used ones are removed.
+
+    everything here reads and writes the disk, the server calls it from a thread so the event loop is never held up.
+    the artifacts are built by the sandbox user and copied by the server, see copy,
+    the copying never follows a symbolic link the compiler might have left instead of a file.
+    """
+    def __init__(self, directory: Union[Path, str], limit: int) -> None:
+        """
+        :param directory: where the artifacts are stored, created when the first artifact is stored.
+        :param limit: the most bytes the artifacts may take up.
+
+        :attr directory: where the artifacts are stored.
+        :attr limit: the most bytes the artifacts may take up.
+        :attr size: how many bytes the artifacts take up as far as this cache knows, None until measured.
+        :attr hits: how many times an artifact was found.
+        :attr misses: how many times an artifact had to be built.
+        """
+        self.directory = Path(directory)
+        self.limit = limit
+        self.size: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(*parts: Union[str, bytes]) -> str:
+        """
+        hashes the parts that decide an artifact.
+
+        every part is prefixed with its length so the parts can not run into each other.
+
+        :param parts: the language, toolchain version, flags and source.
+        :return: the sha256 hex digest of the parts.
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            part = part.encode("utf-8") if isinstance(part, str) else part
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    @staticmethod
+    def measure(path: Path) -> int:
+        """
+        :param path: an artifact.
+        :return: how many bytes the artifact takes up, what another container removed meanwhile is not counted.
+        """
+        try:
+            status = path.lstat()
+        except FileNotFoundError:
+            return 0
+        if not stat.S_ISDIR(status.st_mode):
+            return status.st_size
+        size = 0
+        # os.walk skips directories that are gone by the time they are listed
+        for directory, _, files in os.walk(path):
+            for file in files:
+                try:
+                    size += os.stat(os.path.join(directory, file), follow_symlinks=False).st_size
+                except FileNotFoundError:
+                    pass
+        return size
+
+    @staticmethod
+    def copy_file(source: Union[Path, str], destination: Union[Path, str]) -> None:
+        """
+        copies a single file of an artifact.
+
+        the file is opened without following a symbolic link, even one swapped in after it was listed,
+        a symbolic link is copied as a link. anything else than a regular file is refused.
+        the copy never gets the setuid and setgid bits, its owner is the server and not the compiler.
+
+        :param source: the file to copy.
+        :param destination: where to put the copy, it must not exist.
+
+        :raises shutil.SpecialFileError: if the source is not a regular file or a symbolic link.
+
+        :return: None
+        """
+        try:
+            descriptor = os.open(source, os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK)
+        except OSError as e:
+            if e.errno != errno.ELOOP:
+                raise
+            os.symlink(os.readlink(source), destination)
+            return
+        with open(descriptor, "rb") as reader:
+            status = os.fstat(reader.fileno())
+            if not stat.S_ISREG(status.st_mode):
+                raise shutil.SpecialFileError(f"{source} is not a regular file.")
+            with open(destination, "xb") as writer:
+                shutil.copyfileobj(reader, writer)
+        os.chmod(destination, stat.S_IMODE(status.st_mode) & 0o777)
+        os.utime(destination, ns=(status.st_atime_ns, status.st_mtime_ns))
+
+    @classmethod
+    def copy(cls, source: Path, destination: Path) -> None:
+        """
+        copies an artifact, file or directory, see copy_file.
+
+        :param source: the artifact to copy.
+        :param destination: where to put the copy.
+        :return: None
+        """
+        if stat.S_ISDIR(os.lstat(source).st_mode):
+            shutil.copytree(source, destination, symlinks=True, copy_function=cls.copy_file)
+        else:
+            cls.copy_file(source, destination)
+
+    def restore(self, key: str, destination: Path) -> bool:
+        """
+        copies the artifact with some key to where the compiler would have put it.
+
+        the artifact is copied rather than used in place so evicting it can never break a running program.
+        another container sharing the directory might evict the artifact while it is copied,
+        that is a miss and what was copied of it is removed again.
+
+        :param key: the key from self.key.
+        :param destination: where the compiler would have put the artifact.
+        :return: true if the artifact was in the cache.
+        """
+        artifact = self.directory.joinpath(key)
+        try:
+            self.copy(artifact, destination)
+        except OSError as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.debug("could not restore artifact %s: %s", key, e)
+            self.remove(destination)
+            self.misses += 1
+            return False
+        try:
+            os.utime(artifact)
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return True
+
+    def store(self, key: str, source: Path) -> None:
+        """
+        stores a freshly built artifact.
+
+        the artifact is copied next to its final place and then renamed
+        so another container sharing the directory never sees half an artifact.
+
+        :param key: the key from self.key.
+        :param source: the artifact the compiler produced.
+        :return: None
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        artifact = self.directory.joinpath(key)
+        temporary = self.directory.joinpath(f".{key}.{uuid4()}")
+        try:
+            self.copy(source, temporary)
+            size = self.measure(temporary)
+            temporary.rename(artifact)
+        except OSError as e:
+            logger.warning("could not store artifact %s: %s", key, e)
+            self.remove(temporary)
+            return
+        if self.size is not None:
+            self.size += size
+        self.evict()
+
+    @staticmethod
+    def remove(path: Path) -> None:
+        """
+        removes an artifact if it exists.
+
+        :param path: the artifact to remove.
+        :return: None
+        """
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+    def evict(self) -> None:
+        """
+        removes the least recently used artifacts until they fit in self.limit.
+
+        the directory is only measured when the size known by this cache is above the limit,
+        the other containers sharing it might have removed artifacts since, even while it is measured.
+
+        :return: None
+        """
+        if self.size is not None and self.size <= self.limit:
+            return
+        artifacts = []
+        for artifact in self.directory.iterdir():
+            if artifact.name.startswith("."):
+                continue
+            try:
+                used = artifact.stat().st_mtime
+            except FileNotFoundError:
+                # evicted by another container since the directory was listed
+                continue
+            artifacts.append((used, artifact, self.measure(artifact)))
+        artifacts.sort(key=lambda entry: entry[0])
+        self.size = sum(size for _, _, size in artifacts)
+        for _, artifact, size in artifacts:
+            if self.size <= self.limit:
+                break
+            self.remove(artifact)
+            self.size -= size
+            logger.debug("evicted artifact %s (%s bytes).", artifact.name, size)
+
+    def __str__(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses"
@@ -14,6 +14,9 @@ class Errors:
     class InternalServerError(Exception):
         pass
 
+    class FrameTooLarge(ConnectionError):
+        pass
+
     class ContainerStartupError(Exception):
         pass
 
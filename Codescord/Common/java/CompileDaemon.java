@@ -0,0 +1,34 @@
+import javax.tools.JavaCompiler;
+import javax.tools.ToolProvider;
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.nio.charset.StandardCharsets;
+
+/**
+ * compiles java sources for Codescord.Common.languages.JavaDaemon without starting a new compiler for every source.
+ *
+ * reads one request per line from stdin, the source file and the directory to put the classes in separated by a tab.
+ * answers every request on stdout with a line holding the exit code of the compiler and the number of bytes of
+ * diagnostics, followed by the diagnostics.
+ * only compiles, the classes are run in a new jvm so a source never shares statics, stdout or exit with another.
+ */
+public class CompileDaemon {
+    public static void main(String[] args) throws IOException {
+        JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+        BufferedReader requests = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        OutputStream responses = System.out;
+        String request;
+        while ((request = requests.readLine()) != null) {
+            String[] paths = request.split("\t");
+            ByteArrayOutputStream diagnostics = new ByteArrayOutputStream();
+            int code = compiler.run(null, diagnostics, diagnostics, "-d", paths[1], paths[0]);
+            byte[] output = diagnostics.toByteArray();
+            responses.write((code + " " + output.length + "\n").getBytes(StandardCharsets.UTF_8));
+            responses.write(output);
+            responses.flush();
+        }
+    }
+}
@@ -1,99 +1,679 @@
 from typing import *
 import asyncio
+import os
+import re
+import shutil
+import tempfile
 from pathlib import Path
 from uuid import uuid4
+from functools import lru_cache, partial
+from .artifacts import ArtifactCache
+from .zygote import Zygote
+from .processes import Process, hand_over, sandbox, spawn, supervisor
+from .usage import record
+from .errors import Errors
+from . import profiles
+import time
 
 
-async def subprocess(stdin: str) -> asyncio.subprocess.Process:
-    return await asyncio.create_subprocess_exec(
-        *stdin.split(), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+Stream = Callable[[bytes], Awaitable[None]]
 
+chunk_size = 1 << 16
+stderr_limit = 1 << 16
+# the most stdout a single process may produce before it is killed, can be changed with this environment variable
+output_limit = 1 << 20
+output_variable = "CODESCORD_OUTPUT_LIMIT"
+truncation_marker = "\n... output truncated after {} bytes."
+# where compiled programs are cached, a volume shared by the containers, see ArtifactCache
+artifacts_variable = "CODESCORD_ARTIFACTS"
+artifacts_volume = "codescord-artifacts"
+container_artifacts = "/Codescord/artifacts"
+artifacts = ArtifactCache(os.environ.get(artifacts_variable, Path(tempfile.gettempdir()).joinpath("codescord-artifacts")),
+                          1 << 28)
+# the version output of every toolchain asked for, it does not change while the server runs
+toolchains: Dict[str, str] = {}
+# where the Dockerfile prepares things for the toolchains, the working directory of the server
+prepared = Path(__file__).parents[2]
+# c# project prepared by the Dockerfile, restored and built once so a source only needs to be compiled
+cs_template = prepared.joinpath("cs")
+# class data sharing archive with the classes of javac and the java runtime made by the Dockerfile
+# and the empty directory it was made with as class path, the class path of a jvm using it must start with that
+java_archive = prepared.joinpath("java.jsa")
+java_archive_classpath = prepared.joinpath("cds")
+# the compiled CompileDaemon, the daemon is only used if its there and not turned off with the environment variable
+java_daemon_classes = prepared.joinpath("java")
+java_daemon_variable = "CODESCORD_JAVA_DAEMON"
+# python sources are forked from a zygote that has imported these modules from process.requirements.txt already,
+# the modules can be changed and the zygote turned off with the environment variables
+python_preload_variable = "CODESCORD_PYTHON_PRELOAD"
+python_preload = os.environ.get(python_preload_variable, "numpy,PIL.Image,requests").split(",")
+python_zygote_variable = "CODESCORD_PYTHON_ZYGOTE"
+# the go build cache the Dockerfile filled with the standard library, read only to the sources,
+# every go compilation gets a cache of its own layered on top of it, see go_cache_layer
+go_cache = os.environ.get("GOCACHE")
 
-class Languages:
-    @staticmethod
-    async def php(file: Union[Path, str], sys_args: str) -> bytes:
-        process = await subprocess(f"php -f {file} {sys_args}")
-        stdout, stderr = await process.communicate()
-        return stdout if process.returncode == 0 else stderr
 
-    @staticmethod
-    async def java(file: Union[Path, str], sys_args: str) -> bytes:
-        process = await subprocess(f"java {file} {sys_args}")
-        stdout, stderr = await process.communicate()
-        return stdout if process.returncode == 0 else stderr
+async def subprocess(stdin: Union[str, List[str]], scratch: Path = None, sandboxed: bool = False,
+                     limits: Dict[str, int] = None) -> Process:
+    """
+    starts a process with its stdout and stderr piped.
 
-    @staticmethod
-    async def javascript(file: Union[Path, str], sys_args: str) -> bytes:
-        process = await subprocess(f"node {file} {sys_args}")
-        stdout, stderr = await process.communicate()
-        return stdout if process.returncode == 0 else stderr
+    the process is reaped by the server so what it cost is known when it has exited, see Codescord.Common.processes.
 
-    @staticmethod
-    async def go(file: Union[Path, str], sys_args: str) -> bytes:
-        process = await subprocess(f"go run {file} {sys_args}")
-        stdout, stderr = await process.communicate()
-        return stdout if process.returncode == 0 else stderr
+    the process can be given a scratch directory, it then runs in that directory and uses it for
+    temporary files so nothing it writes is left after the directory is removed.
+    a container is reused for many sources so this keeps one source from seeing what another one left behind.
+    the process gets the rlimits of the run stage from the profile of the source being processed
+    unless it is given others, see Codescord.Common.profiles.
+    a sandboxed process runs as the sandbox user with the scratch directory as its home,
+    see Codescord.Common.processes.sandbox.
 
-    @staticmethod
-    async def cpp(file: Union[Path, str], sys_args: str) -> bytes:
-        executable = file.parent.joinpath(str(uuid4()))
-        process = await subprocess(f"g++ -o {executable} {file} {sys_args}")
-        _, stderr = await process.communicate()
-        if not process.returncode == 0:
-            return stderr
-
-        process = await subprocess(f"{executable}")
-        stdout, stderr = await process.communicate()
-        return stdout if process.returncode == 0 else stderr
+    :param stdin: the command to run, split on whitespace if its not an argv already.
+    :param scratch: the directory to run the process in.
+    :param sandboxed: if the process runs something the source decides.
+    :param limits: the rlimits of the process, the compilers get the compile limits from the profile.
+    :return: the started process.
+    """
+    user = sandbox() if sandboxed else None
+    environment = None
+    if scratch:
+        environment = {**os.environ, "TMPDIR": str(scratch), **({"HOME": str(scratch)} if user else {})}
+    return await spawn(stdin.split() if isinstance(stdin, str) else stdin, scratch, environment,
+                       profiles.current.get().limits if limits is None else limits, user)
 
-    @staticmethod
-    async def cs(file: Union[Path, str], sys_args: str) -> bytes:
-        cs_project = file.parent.joinpath("cs")
 
-        process = await subprocess(f"dotnet new console --output {cs_project}")
-        _, stderr = await process.communicate()
-        if not process.returncode == 0:
-            return stderr
+async def within(stage: str, awaitable: Awaitable, timeout: float) -> Any:
+    """
+    waits for a stage of processing a source to finish.
 
-        process = await subprocess(f"mv {file} {cs_project.joinpath(file.name)}")
-        _, stderr = await process.communicate()
-        if not process.returncode == 0:
-            return stderr
+    :param stage: compile or run.
+    :param awaitable: the stage.
+    :param timeout: the most seconds the stage may take.
 
-        process = await subprocess(f"rm {cs_project.joinpath('Program.cs')}")
-        _, stderr = await process.communicate()
-        if not process.returncode == 0:
-            return stderr
+    :raises Errors.ProcessTimedOut: with the stage if it took longer than timeout.
 
-        process = await subprocess(f"dotnet run --project {cs_project} {sys_args}")
-        stdout, stderr = await process.communicate()
-        return stdout if process.returncode == 0 else stderr
+    :return: what the stage gave back.
+    """
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise Errors.ProcessTimedOut(stage)
 
-    @staticmethod
-    async def python(file: Union[Path, str], sys_args: str) -> bytes:
-        process = await subprocess(f"python3 {file} {sys_args}")
+
+async def read_limited(reader: asyncio.StreamReader, limit: int) -> bytes:
+    """
+    reads a pipe until it closes but only keeps the first `limit` bytes.
+
+    the rest is still read so the process never blocks on a full pipe.
+
+    :param reader: the pipe to read.
+    :param limit: the maximum number of bytes to keep.
+    :return: the first `limit` bytes from the pipe.
+    """
+    blob = bytearray()
+    while chunk := await reader.read(chunk_size):
+        blob += chunk[:limit - len(blob)]
+    return bytes(blob)
+
+
+async def communicate(process: Process, stream: Stream = None, limit: int = output_limit) -> bytes:
+    """
+    waits for the process to finish and gives back its output, see collect.
+
+    this is the run stage of a source and times out after the run timeout from the profile of the source.
+
+    :param process: the started process.
+    :param stream: coroutine function that is given the stdout of the process as it is produced.
+    :param limit: the most bytes of stdout to give back or stream.
+
+    :raises Errors.ProcessTimedOut: if the process took longer than the run timeout.
+
+    :return: the output that was not streamed.
+    """
+    return await within("run", collect(process, stream, limit), profiles.current.get().run_timeout)
+
+
+async def collect(process: Process, stream: Stream = None, limit: int = output_limit) -> bytes:
+    """
+    waits for the process to finish and gives back its output.
+
+    stdout is read chunk by chunk while the process runs and at most `limit` bytes of it are kept.
+    if the process writes more than that it is killed and the output ends with truncation_marker,
+    so a program printing in an endless loop never fills the memory or the connection.
+    stderr is read at the same time but only the first stderr_limit bytes are kept.
+
+    without stream stdout is given back if the process succeeded or was truncated, else stderr.
+
+    with stream stdout is handed to stream chunk by chunk as soon as the process produces it,
+    stream is awaited before the next chunk is read so a slow recipient slows down the process
+    instead of the output piling up in memory. stderr is given back if the process failed,
+    otherwise nothing is given back.
+
+    what the process cost is added to the usage of the source as its run stage, see Codescord.Common.usage.
+
+    :param process: the started process.
+    :param stream: coroutine function that is given the stdout of the process as it is produced.
+    :param limit: the most bytes of stdout to give back or stream.
+    :return: the output that was not streamed.
+    """
+    started = time.perf_counter()
+    stderr = asyncio.create_task(read_limited(process.stderr, stderr_limit))
+    stdout = bytearray()
+    size = 0
+    truncated = False
+    try:
+        while chunk := await process.stdout.read(chunk_size):
+            if len(chunk) > limit - size:
+                chunk = chunk[:limit - size]
+                truncated = True
+            size += len(chunk)
+            if stream and chunk:
+                await stream(chunk)
+            else:
+                stdout += chunk
+            if truncated:
+                process.kill()
+                break
+        await process.wait()
+        record("run", started, process)
+        if truncated:
+            stdout += truncation_marker.format(limit).encode("utf-8")
+        elif process.returncode != 0:
+            return await stderr
+        if stream and stdout:
+            await stream(bytes(stdout))
+            return b""
+        return bytes(stdout)
+    finally:
+        stderr.cancel()
+
+
+async def toolchain_version(command: List[str]) -> str:
+    """
+    asks a toolchain for its version, only the first time.
+
+    :param command: the argv that prints the version of the toolchain.
+    :return: the printed version.
+    """
+    if (key := " ".join(command)) not in toolchains:
+        process = await subprocess(command, limits=profiles.current.get().compile_limits)
         stdout, stderr = await process.communicate()
-        return stdout if process.returncode == 0 else stderr
+        toolchains[key] = (stdout + stderr).decode("utf-8", "replace")
+    return toolchains[key]
+
+
+Compiler = Callable[[], Awaitable[Tuple[int, bytes]]]
+# what the argv templates of a language are filled in with, see expand
+Placeholders = Dict[str, Union[str, List[str]]]
+
+
+def expand(template: List[str], placeholders: Placeholders) -> List[str]:
+    """
+    fills in an argv template.
+
+    an argument that is only a placeholder for a list, like {args}, is replaced by the items of the list
+    so the list can be empty. any other argument is formatted with the placeholders that are strings.
+
+    :param template: the argv with placeholders.
+    :param placeholders: the values of the placeholders.
+    :return: the argv.
+    """
+    strings = {name: value for name, value in placeholders.items() if isinstance(value, str)}
+    argv = []
+    for argument in template:
+        if isinstance(value := placeholders.get(argument[1:-1]), list):
+            argv.extend(value)
+        else:
+            argv.append(argument.format(**strings))
+    return argv
+
+
+def java_flags(classpath: Path = None, prefix: str = "") -> str:
+    """
+    :param classpath: the class path of the jvm.
+    :param prefix: put in front of every flag, `-J` passes the flags from javac to its jvm.
+    :return: the flags that make a jvm map the classes from java_archive instead of loading them, if there is one.
+    """
+    if not java_archive.is_file():
+        return f"-cp {classpath}" if classpath else ""
+    flags = f"{prefix}-Xshare:auto {prefix}-XX:SharedArchiveFile={java_archive}"
+    return f"{flags} -cp {java_archive_classpath}{os.pathsep}{classpath}" if classpath else flags
+
+
+class JavaDaemon:
+    """
+    a jvm kept running that compiles java sources, see CompileDaemon.java.
+
+    compiling in a warm jvm skips starting javac for every source. the daemon only compiles,
+    the program is run in a new jvm like before so sources never share statics, stdout or exit.
+    a daemon that dies or gets out of step (a compilation cancelled by a timeout) is killed
+    and started again on the next compilation.
+    the daemon runs as the sandbox user like every other compiler, see Codescord.Common.processes.sandbox.
+    """
+    def __init__(self) -> None:
+        """
+        :attr process: the jvm running CompileDaemon, None until the first compilation.
+        :attr lock: held for the duration of a compilation, the daemon compiles one source at a time.
+        """
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.lock = asyncio.Lock()
 
     @staticmethod
-    async def c(file: Union[Path, str], sys_args: str) -> bytes:
-        executable = file.parent.joinpath(str(uuid4()))
-        process = await subprocess(f"gcc -o {executable} {file} {sys_args}")
-        _, stderr = await process.communicate()
-        if not process.returncode == 0:
-            return stderr
-
-        process = await subprocess(f"{executable}")
-        stdout, stderr = await process.communicate()
-        if not process.returncode == 0:
-            return stderr
-        return stdout
+    def enabled() -> bool:
+        """
+        :return: true if the daemon was built and not turned off.
+        """
+        return (java_daemon_classes.joinpath("CompileDaemon.class").is_file()
+                and os.environ.get(java_daemon_variable, "1") != "0")
+
+    async def compile(self, source: Path, classes: Path) -> Tuple[int, bytes]:
+        """
+        compiles a java source.
+
+        :param source: the source file.
+        :param classes: the directory to put the compiled classes in.
+
+        :raises ConnectionError: if the daemon died during the compilation.
+
+        :return: the exit code of the compiler and its diagnostics.
+        """
+        async with self.lock:
+            if self.process is None or self.process.returncode is not None:
+                uid, gid = sandbox() or (None, None)
+                self.process = await asyncio.create_subprocess_exec(
+                    "java", *java_flags(java_daemon_classes).split(), "CompileDaemon",
+                    stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                    user=uid, group=gid, extra_groups=[] if uid is not None else None)
+            try:
+                self.process.stdin.write(f"{source}\t{classes}\n".encode("utf-8"))
+                await self.process.stdin.drain()
+                code, size = map(int, (await self.process.stdout.readline()).split())
+                return code, await self.process.stdout.readexactly(size)
+            except BaseException as e:
+                self.process.kill()
+                self.process = None
+                if isinstance(e, (ValueError, asyncio.IncompleteReadError)):
+                    raise ConnectionResetError("the java compile daemon died.") from e
+                raise
+
+
+java_daemon = JavaDaemon()
+python_zygote = Zygote(list(filter(None, python_preload)))
+
+
+async def warm_up() -> None:
+    """
+    starts the compiler servers of the toolchains that keep one running between builds.
+
+    a throwaway program is built once when the server starts so the first source does not have to wait
+    for the compiler server (roslyn and the msbuild nodes for c#, the java compile daemon) to start.
+    the python zygote is started as well so the first python source does not wait for its imports.
+    the programs are built as the sandbox user so the compiler servers are the ones the sources use.
+
+    :return: None
+    """
+    if cs_template.is_dir():
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as scratch:
+            project = Path(scratch).joinpath("cs")
+            shutil.copytree(cs_template, project, ignore=shutil.ignore_patterns("bin"))
+            project.joinpath("warm_up.cs").write_text("System.Console.WriteLine();")
+            hand_over(Path(scratch))
+            command = expand(registry["cs"].compile, {
+                "project": str(project), "restore": ["--no-restore"], "output": str(Path(scratch).joinpath("out"))})
+            try:
+                process = await subprocess(command, Path(scratch), True, profiles.current.get().compile_limits)
+                await process.communicate()
+            except FileNotFoundError:
+                pass
+    if JavaDaemon.enabled():
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as scratch:
+            source = Path(scratch).joinpath("WarmUp.java")
+            source.write_text("class WarmUp { }")
+            hand_over(Path(scratch))
+            try:
+                await java_daemon.compile(source, Path(scratch))
+            except (FileNotFoundError, ConnectionError):
+                pass
+    if os.environ.get(python_zygote_variable, "1") != "0":
+        try:
+            await python_zygote.start()
+        except ConnectionError:
+            pass
+
+
+def java_classes(code: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    finds the classes of a java source that decide how its compiled and launched.
+
+    only declarations at the start of a line are looked at, those are the top level ones in any normal source.
+
+    :param code: the java source.
+    :return: the first top level class, that is the one launched, and the public class the file must be named after.
+    """
+    declarations = re.findall(r"^((?:(?:public|final|abstract)\s+)*)(?:class|interface|enum|record)\s+(\w+)",
+                              code, re.MULTILINE)
+    if not declarations:
+        return None, None
+    public = next((name for modifiers, name in declarations if "public" in modifiers), None)
+    return declarations[0][1], public
+
+
+async def java_prepare(placeholders: Placeholders) -> Optional[Placeholders]:
+    """
+    names a java source after its public class, as javac wants, and finds the class to launch.
+
+    :param placeholders: the placeholders of the source.
+    :return: the placeholders for compiling and running it, None if there is no class to compile.
+    """
+    file = Path(placeholders["file"])
+    main, public = java_classes(file.read_text("utf-8", "replace"))
+    if not main:
+        return None
+    classes = file.parent.joinpath("classes")
+    return {**placeholders,
+            "file": str(file.rename(file.parent.joinpath(f"{public or main}.java"))),
+            "main": main,
+            "classes": str(classes),
+            "javac": java_flags(prefix="-J").split(),
+            "jvm": java_flags(classes).split()}
+
+
+async def java_script(placeholders: Placeholders) -> Placeholders:
+    """
+    :param placeholders: the placeholders of a java source without a class to compile.
+    :return: the placeholders for launching it as a single file program.
+    """
+    return {**placeholders, "jvm": java_flags().split()}
+
+
+def java_compiler(placeholders: Placeholders) -> Optional[Compiler]:
+    """
+    :param placeholders: the placeholders of a java source from java_prepare.
+    :return: the java compile daemon if its enabled, see JavaDaemon.
+    """
+    if not JavaDaemon.enabled():
+        return None
+    return partial(java_daemon.compile, Path(placeholders["file"]), Path(placeholders["classes"]))
+
+
+def cs_project(project: Path) -> None:
+    """
+    copies cs_template for a source and gives the copy to the sandbox user.
+
+    :param project: where to put the project.
+    :return: None
+    """
+    shutil.copytree(cs_template, project, ignore=shutil.ignore_patterns("bin"))
+    hand_over(project)
+
+
+async def cs_prepare(placeholders: Placeholders) -> Placeholders:
+    """
+    puts a c# source in a project, a copy of cs_template if the Dockerfile made one.
+
+    without the template a new project is made and has to be restored when its built,
+    if that fails the build fails on the missing project.
+    the copy is given to the sandbox user so the compiler can write its obj and bin directories.
+
+    :param placeholders: the placeholders of the source.
+    :return: the placeholders for compiling and running it.
+    """
+    file = Path(placeholders["file"])
+    project = file.parent.joinpath("cs")
+    output = file.parent.joinpath("out")
+    if cs_template.is_dir():
+        await asyncio.get_running_loop().run_in_executor(None, cs_project, project)
+        restore = ["--no-restore"]
+    else:
+        process = await subprocess(["dotnet", "new", "console", "--output", str(project)], file.parent, True,
+                                   profiles.current.get().compile_limits)
+        await process.communicate()
+        project.joinpath("Program.cs").unlink(missing_ok=True)
+        restore = []
+    return {**placeholders,
+            "file": str(file.rename(project.joinpath(file.name))),
+            "project": str(project),
+            "restore": restore,
+            "output": str(output),
+            "assembly": str(output.joinpath("cs.dll"))}
+
+
+@lru_cache(maxsize=None)
+def go_cache_entries() -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    lists go_cache once, it does not change while the server runs.
+
+    :return: the directories and the files in go_cache relative to it, parents before their children.
+    """
+    if not go_cache or not os.path.isdir(go_cache):
+        return (), ()
+    directories, files = [], []
+    for directory, _, names in os.walk(go_cache):
+        relative = os.path.relpath(directory, go_cache)
+        if relative != ".":
+            directories.append(relative)
+        files.extend(os.path.join(relative, name) for name in names)
+    return tuple(directories), tuple(files)
+
+
+def go_cache_layer(layer: Path) -> None:
+    """
+    makes a go build cache for a single compilation on top of go_cache.
+
+    the layer has directories of its own owned by the sandbox user with a symbolic link to every entry of go_cache.
+    go finds the standard library through the links and writes what it compiles next to them,
+    so go_cache is never written to and a source never sees what another one compiled.
+
+    :param layer: where to make the cache.
+    :return: None
+    """
+    user = sandbox()
+    directories, files = go_cache_entries()
+    for directory in (".", *directories):
+        path = os.path.normpath(os.path.join(layer, directory))
+        os.mkdir(path)
+        if user:
+            os.chown(path, *user)
+    for file in files:
+        os.symlink(os.path.join(go_cache, file), os.path.join(layer, file))
+
+
+async def go_prepare(placeholders: Placeholders) -> Placeholders:
+    """
+    :param placeholders: the placeholders of a go source.
+    :return: the placeholders with {gocache}, a build cache made for the source with go_cache_layer.
+    """
+    layer = Path(placeholders["directory"]).joinpath("gocache")
+    await asyncio.get_running_loop().run_in_executor(None, go_cache_layer, layer)
+    return {**placeholders, "gocache": str(layer)}
+
+
+async def python_spawner(placeholders: Placeholders) -> Optional[Process]:
+    """
+    forks a python source from python_zygote unless the zygote is turned off.
+
+    :param placeholders: the placeholders of the source.
+    :return: the forked child, None if the zygote is turned off.
+    """
+    if os.environ.get(python_zygote_variable, "1") == "0":
+        return None
+    process = await python_zygote.spawn(Path(placeholders["file"]), placeholders["args"],
+                                        Path(placeholders["directory"]), profiles.current.get().limits, sandbox())
+    supervisor.track(process)
+    return process
+
+
+class Language:
+    """
+    how the sources of a language are compiled and run.
+
+    a language is declared with argv templates for its stages, filled in with expand.
+    every template can use {file} (the source), {directory} (the workspace the source is in),
+    {program} (where a compiled program goes) and {args} (the sys args given with the source).
+    the hooks of a language add placeholders of their own for the toolchains that need more than that.
+
+    the compile stage and the run stage are separate, the server runs them one after the other,
+    see Codescord.Server.server.Server.stages. compiling is skipped for a language without a compile template.
+    a compiled program is looked up in the artifact cache before compiling if the language is cacheable,
+    by the language, the version of its toolchain, the sys args if they are given to the compiler and the source.
+    the compilers and the programs run as the sandbox user (see Codescord.Common.processes.sandbox),
+    only the server writes to the artifact cache, it copies the finished program there.
+    """
+    def __init__(self, name: str, extension: str, run: List[str], compile: List[str] = None,
+                 version: List[str] = None, aliases: Tuple[str, ...] = (), cacheable: bool = True,
+                 artifact: str = "{program}",
+                 prepare: Callable[[Placeholders], Awaitable[Optional[Placeholders]]] = None,
+                 script: "Language" = None,
+                 compiler: Callable[[Placeholders], Optional[Compiler]] = None,
+                 spawner: Callable[[Placeholders], Awaitable[Optional[Process]]] = None) -> None:
+        """
+        :param name: the name of the language, its profile is looked up by it, see Codescord.Common.profiles.
+        :param extension: the file extension of a source.
+        :param run: the argv that runs a source or the program compiled from it.
+        :param compile: the argv that compiles a source, None if the language is not compiled.
+        :param version: the argv that prints the version of the compiler, part of the key of a cached program.
+        :param aliases: other names the language is given by.
+        :param cacheable: if compiled programs are kept in the artifact cache.
+        :param artifact: where the compiler puts the program, file or directory.
+        :param prepare: given the placeholders of a source before it is compiled and gives back the placeholders
+            to use instead, None if there is nothing to compile and the source is run as `script`.
+        :param script: the language a source is run as when prepare finds nothing to compile.
+        :param compiler: given the placeholders and gives back a compiler to use instead of the compile argv, if any.
+        :param spawner: given the placeholders and starts the program instead of the run argv, if it can.
+
+        :attr name: the name of the language, its profile is looked up by it, see Codescord.Common.profiles.
+        :attr extension: the file extension of a source.
+        :attr run: the argv that runs a source or the program compiled from it.
+        :attr compile: the argv that compiles a source, None if the language is not compiled.
+        :attr version: the argv that prints the version of the compiler, part of the key of a cached program.
+        :attr aliases: other names the language is given by.
+        :attr cacheable: if compiled programs are kept in the artifact cache.
+        :attr artifact: where the compiler puts the program, file or directory.
+        :attr prepare: gives back the placeholders to compile a source with.
+        :attr script: the language a source is run as when prepare finds nothing to compile.
+        :attr compiler: gives back a compiler to use instead of the compile argv, if any.
+        :attr spawner: starts the program instead of the run argv, if it can.
+        """
+        self.name = name
+        self.extension = extension
+        self.run = run
+        self.compile = compile
+        self.version = version
+        self.aliases = aliases
+        self.cacheable = cacheable
+        self.artifact = artifact
+        self.prepare = prepare
+        self.script = script
+        self.compiler = compiler
+        self.spawner = spawner
+
+    async def setup(self, file: Path, sys_args: str) -> Tuple["Language", Placeholders]:
+        """
+        fills in the placeholders for a source saved in its workspace.
+
+        :param file: the source file.
+        :param sys_args: the sys args given with the source.
+        :return: the language to process the source as, self unless it is run as self.script,
+            and the placeholders for its stages.
+        """
+        placeholders = {"file": str(file), "directory": str(file.parent),
+                        "program": str(file.parent.joinpath(str(uuid4()))), "args": sys_args.split()}
+        if self.prepare:
+            if (prepared := await self.prepare(placeholders)) is None:
+                return await self.script.setup(file, sys_args)
+            placeholders = prepared
+        return self, placeholders
+
+    async def build(self, placeholders: Placeholders) -> Optional[bytes]:
+        """
+        the compile stage, compiles a source or takes the compiled program from the artifact cache.
+
+        the artifact is stored if the compilation succeeded.
+        the source is read and the artifact cache is used from a thread so the other sources are not held up.
+        what the compilation cost is added to the usage of the source as its compile stage.
+        the compiler runs under the compile limits from the profile of the source.
+        the compilation times out after the compile timeout from the profile of the source.
+
+        :param placeholders: the placeholders from setup.
+
+        :raises Errors.ProcessTimedOut: if the compilation took longer than the compile timeout.
+
+        :return: None if the program is in place else the output from the failed compilation.
+        """
+        if self.compile is None:
+            return None
+        loop = asyncio.get_running_loop()
+        file = Path(placeholders["file"])
+        artifact = Path(self.artifact.format(**placeholders))
+        key = None
+        if self.cacheable:
+            flags = " ".join(placeholders["args"]) if "{args}" in self.compile else ""
+            version = await toolchain_version(self.version) if self.version else ""
+            key = artifacts.key(self.name, version, flags, await loop.run_in_executor(None, file.read_bytes))
+            if await loop.run_in_executor(None, artifacts.restore, key, artifact):
+                return None
+        started = time.perf_counter()
+        timeout = profiles.current.get().compile_timeout
+        if compiler := (self.compiler and self.compiler(placeholders)):
+            code, output = await within("compile", compiler(), timeout)
+            record("compile", started)
+        else:
+            process = await subprocess(expand(self.compile, placeholders), file.parent, True,
+                                       profiles.current.get().compile_limits)
+            stdout, stderr = await within("compile", process.communicate(), timeout)
+            code, output = process.returncode, stdout + stderr
+            record("compile", started, process)
+        if not code == 0:
+            return output
+        if key:
+            await loop.run_in_executor(None, artifacts.store, key, artifact)
+        return None
+
+    async def start(self, placeholders: Placeholders) -> Process:
+        """
+        the run stage, starts the program.
+
+        :param placeholders: the placeholders from setup.
+        :return: the started program, see communicate for waiting for it.
+        """
+        if self.spawner and (process := await self.spawner(placeholders)):
+            return process
+        return await subprocess(expand(self.run, placeholders), Path(placeholders["directory"]), True)
+
+    def __repr__(self) -> str:
+        return f"Language({self.name})"
+
+
+# the languages the server can process by name, adding a language is adding it here
+registry: Dict[str, Language] = {language.name: language for language in (
+    Language("python", "py", ["python3", "{file}", "{args}"], aliases=("py",), spawner=python_spawner),
+    Language("javascript", "js", ["node", "{file}", "{args}"], aliases=("js",)),
+    Language("php", "php", ["php", "-f", "{file}", "{args}"]),
+    # the sys args of c and c++ are flags for the compiler
+    Language("c", "c", ["{program}"], ["gcc", "-o", "{program}", "{file}", "{args}"], ["gcc", "--version"]),
+    Language("cpp", "cpp", ["{program}"], ["g++", "-o", "{program}", "{file}", "{args}"], ["g++", "--version"],
+             aliases=("c++",)),
+    # go compiles with a build cache of its own on top of the one the Dockerfile made, see go_prepare
+    Language("go", "go", ["{program}", "{args}"],
+             ["env", "GOCACHE={gocache}", "go", "build", "-o", "{program}", "{file}"], ["go", "version"],
+             prepare=go_prepare),
+    Language("java", "java", ["java", "{jvm}", "{main}", "{args}"],
+             ["javac", "{javac}", "-J-XX:TieredStopAtLevel=1", "-d", "{classes}", "{file}"], ["javac", "-version"],
+             artifact="{classes}", prepare=java_prepare, compiler=java_compiler,
+             script=Language("java", "java", ["java", "{jvm}", "{file}", "{args}"], prepare=java_script)),
+    Language("cs", "cs", ["dotnet", "{assembly}", "{args}"],
+             ["dotnet", "build", "{project}", "{restore}", "-nologo", "-v", "q", "-clp:NoSummary", "-o", "{output}"],
+             ["dotnet", "--version"], aliases=("c#",), artifact="{output}", prepare=cs_prepare),
+)}
 
 
-def get_language_map() -> Dict[str, Callable]:
-    return {method_name: getattr(Languages, method_name)
-            for method_name in dir(Languages)
-            if not method_name.startswith("__")}
+def get_language_map() -> Dict[str, Language]:
+    """
+    :return: the languages in registry by their names and aliases.
+    """
+    return {name: language
+            for language in registry.values()
+            for name in (language.name, *language.aliases)}
 
 
 if __name__ == '__main__':
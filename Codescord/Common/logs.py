@@ -0,0 +1,75 @@
+from typing import Dict, Tuple
+import logging
+
+
+# environment variable with the log level specification, passed on to the docker containers
+variable = "CODESCORD_LOG_LEVEL"
+
+# attributes every LogRecord has, anything else on a record was given with `extra` and is a structured field
+reserved = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class Formatter(logging.Formatter):
+    """
+    formats log records as one line with the fields given with `extra` appended as key=value pairs.
+
+    logger.info("connection closed.", extra={"frames": 12}) becomes
+    `2020-01-01 12:00:00,000 INFO Codescord.Server.server: connection closed. frames=12`
+    """
+    def __init__(self) -> None:
+        super(Formatter, self).__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super(Formatter, self).format(record)
+        fields = " ".join(f"{key}={value}" for key, value in vars(record).items() if key not in reserved)
+        return f"{line} {fields}" if fields else line
+
+
+def parse_levels(spec: str) -> Tuple[int, Dict[str, int]]:
+    """
+    parses a log level specification.
+
+    the specification is a comma separated list where an entry without a `=` is the level for everything
+    and `module=level` sets the level for a single logger and the loggers below it.
+    `warning,Codescord.Common.net=debug` logs warnings and above everywhere and everything from Codescord.Common.net.
+
+    :param spec: the log level specification.
+
+    :raises ValueError: if a level is not one of the levels known by logging.
+
+    :return: the root level and a map of logger name to level.
+    """
+    root = logging.INFO
+    levels = {}
+    for entry in filter(None, (entry.strip() for entry in spec.split(","))):
+        name, _, level = entry.rpartition("=")
+        number = logging.getLevelName(level.upper())
+        if not isinstance(number, int):
+            raise ValueError(f"unknown log level `{level}`.")
+        if name:
+            levels[name] = number
+        else:
+            root = number
+    return root, levels
+
+
+def setup_logging(spec: str = "info") -> None:
+    """
+    sets up logging for the application.
+
+    every module logs to its own logger named after the module so the level can be set per module.
+    messages that are logged on every step of the protocol are at DEBUG level,
+    logging defers the formatting of those until a handler actually wants the record
+    so at higher levels they cost no more than a level check.
+
+    :param spec: the log level specification, see parse_levels.
+    :return: None
+    """
+    root, levels = parse_levels(spec)
+    handler = logging.StreamHandler()
+    handler.setFormatter(Formatter())
+    logger = logging.getLogger()
+    logger.handlers[:] = [handler]
+    logger.setLevel(root)
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
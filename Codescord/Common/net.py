@@ -1,25 +1,43 @@
+from typing import Tuple
 import socket
 import asyncio
+import logging
 from math import ceil
-from .protocol import Protocol
+from .protocol import Protocol, Frame
 from .errors import Errors
+from .compression import Compression
+
+
+logger = logging.getLogger(__name__)
 
 
 class Net:
     """
     contains base net code for Codescord.Server and Codescord.Client.
+
+    :attr max_chunk: the largest number of bytes asked for in a single receive.
+    :attr port: the tcp port the server listens on inside its container.
+    :attr container_sockets: where the directory for unix sockets is mounted inside a container.
+    :attr socket_name: the name of the unix socket the server listens on.
     """
+    max_chunk = 1 << 16
+    port = 6090
+    container_sockets = "/Codescord/sockets"
+    socket_name = "codescord.sock"
+
     def __init__(self, loop=None) -> None:
         """
         initialises the client object with event loop and max retries for connection errors.
 
         :attr loop: the event loop.
         :attr retries: amount of times to retry the connection if it dies.
+        :attr compression: compresses frames and keeps statistics about how well it pays off.
 
         :param loop: the event loop.
         """
 
         self.loop = loop if loop else asyncio.get_event_loop()
+        self.compression = Compression()
 
     async def response_as_int(self, connection: socket.socket, length=Protocol.buffer_size, endian="big", signed=False) -> int:
         """
@@ -38,9 +56,9 @@ class Net:
 
         :return: None
         """
-        print("awaiting response as int...")
+        logger.debug("awaiting response as int...")
         integer = int.from_bytes((await self.loop.sock_recv(connection, length)), endian, signed=signed)
-        print(f"got response as int ({integer}).")
+        logger.debug("got response as int (%s).", integer)
         return integer
 
     async def send_int_as_bytes(self, connection: socket.socket, integer: int, length=Protocol.buffer_size, endian="big", signed=False) -> None:
@@ -56,9 +74,9 @@ class Net:
         :param signed: signed or unsigned integer.
         :return: None
         """
-        print(f"sending int ({integer}) as bytes...")
+        logger.debug("sending int (%s) as bytes...", integer)
         await self.loop.sock_sendall(connection, integer.to_bytes(length, endian, signed=signed))
-        print(f"sent int ({integer}) as bytes.")
+        logger.debug("sent int (%s) as bytes.", integer)
 
     async def assert_response_status(self, connection: socket.socket, status=Protocol.Status.success) -> None:
         """
@@ -79,13 +97,32 @@ class Net:
 
         :return: None
         """
-        print(f"asserting response status ({status})...")
+        logger.debug("asserting response status (%s)...", status)
         response = await self.response_as_int(connection)
+        self.raise_for_status(response, status)
+
+    @staticmethod
+    def raise_for_status(response: int, status: int) -> None:
+        """
+        compares a received status code with the expected one.
+
+        shared by the v1 and the framed protocol so both raise the same errors.
 
+        :param response: the received status code.
+        :param status: the expected status code.
+
+        :raises NotImplementedByRecipient: if the instruction is not implemented by the recipient.
+        :raises InternalServerError: if the server can communicate but something goes wrong on the server side.
+        :raises ProcessTimedOut: if the processing of the source took too long.
+        :raises NotImplementedInProtocol: if the status code is not part of the protocol.
+        :raises AssertionError: if the status code is valid but not the expected one.
+
+        :return: None
+        """
         if response == status:
-            print(f"response passed assertion ({status}).")
+            logger.debug("response passed assertion (%s).", status)
         else:
-            print(f"response was `{response}` expected {status}.")
+            logger.debug("response was `%s` expected %s.", response, status)
             if response == Protocol.Status.not_implemented:
                 raise Errors.NotImplementedByRecipient(response)
             elif response == Protocol.Status.internal_server_error:
@@ -96,7 +133,7 @@ class Net:
                 raise Errors.NotImplementedInProtocol(response)
             raise AssertionError(f"code `{response}` in assert_response_status")
 
-    async def download(self, connection: socket.socket) -> bytes:
+    async def download(self, connection: socket.socket) -> bytearray:
         """
         downloads some byte blob from the server.
 
@@ -108,7 +145,7 @@ class Net:
         :return: None
         """
 
-        print("downloading...")
+        logger.debug("downloading...")
         # number of bytes required to store the size of the blob in an int
         bites = await self.response_as_int(connection)
         await self.send_int_as_bytes(connection, Protocol.Status.success)
@@ -117,12 +154,9 @@ class Net:
         size = await self.response_as_int(connection, bites)
         await self.send_int_as_bytes(connection, Protocol.Status.success)
 
-        # initialising blob and downloading from socket, blob will be `size` bytes
-        blob = b""
-        for _ in range(int(size / Protocol.max_buffer)):
-            blob += await self.loop.sock_recv(connection, Protocol.max_buffer)
-        blob += await self.loop.sock_recv(connection, (size % Protocol.max_buffer))
-        print("downloaded.")
+        # downloading from socket, blob will be `size` bytes
+        blob = await self.receive_exactly(connection, size)
+        logger.debug("downloaded %s bytes.", size)
         return blob
 
     async def upload(self, connection: socket.socket, payload: bytes) -> None:
@@ -139,7 +173,7 @@ class Net:
 
         :return: None
         """
-        print("uploading...")
+        logger.debug("uploading...")
         # size of the upload
         size = len(payload)
 
@@ -154,7 +188,82 @@ class Net:
 
         await self.loop.sock_sendall(connection, payload)
         await self.assert_response_status(connection, Protocol.Status.success)
-        print("uploaded.")
+        logger.debug("uploaded %s bytes.", size)
+
+    async def receive_exactly(self, connection: socket.socket, size: int) -> bytearray:
+        """
+        receives exactly `size` bytes from the recipient.
+
+        the size is known up front so the blob is allocated once and filled in place with sock_recv_into.
+        sock_recv_into may fill less than asked for so this keeps receiving until the blob is full.
+        the chunk size starts at Protocol.max_buffer and doubles every time a chunk is filled completely,
+        up to self.max_chunk, so small messages stay small and large outputs need few receives.
+
+        :param connection: connection to the recipient.
+        :param size: number of bytes to receive.
+
+        :raises ConnectionResetError: if the recipient closed the connection before everything was received.
+
+        :return: the received bytes.
+        """
+        blob = bytearray(size)
+        chunk = Protocol.max_buffer
+        received = 0
+        with memoryview(blob) as view:
+            while received < size:
+                end = min(received + chunk, size)
+                count = await self.loop.sock_recv_into(connection, view[received:end])
+                if not count:
+                    raise ConnectionResetError(f"connection closed with {size - received} of {size} bytes left.")
+                if count == chunk:
+                    chunk = min(chunk * 2, self.max_chunk)
+                received += count
+        return blob
+
+    async def send_frame(self, connection: socket.socket, frame_type: int, payload: bytes = b"",
+                         flags: int = 0, request: int = 0, capabilities: int = 0) -> None:
+        """
+        sends a single frame of the v2 protocol.
+
+        the header and the payload are sent together in one write and nothing is acknowledged.
+        concurrent senders on the same connection must hold a lock around this call
+        so the frames are not interleaved.
+        the payload is compressed if a compression method is in the capabilities, see Compression.
+
+        :param connection: connection to the recipient.
+        :param frame_type: one of the status codes in Protocol.Status or Frame.Type.
+        :param payload: the byte blob to send with the frame.
+        :param flags: flags for the frame.
+        :param request: the request id the frame belongs to, 0 for the connection itself.
+        :param capabilities: the capabilities agreed on for the connection.
+        :return: None
+        """
+        compressed, payload = await self.compression.compress(payload, capabilities)
+        flags |= compressed
+        logger.debug("sending frame (%s) for request %s with %s bytes...", frame_type, request, len(payload))
+        await self.loop.sock_sendall(connection, Frame.header.pack(frame_type, flags, request, len(payload)) + payload)
+
+    async def receive_frame(self, connection: socket.socket) -> Tuple[int, int, int, bytes]:
+        """
+        receives a single frame of the v2 protocol.
+
+        a compressed payload is decompressed before its returned.
+        a payload larger than Frame.limit is never received or decompressed, the rest of the connection
+        can not be made sense of after it so the connection has to be closed.
+
+        :param connection: connection to the recipient.
+
+        :raises Errors.FrameTooLarge: if the payload is larger than Frame.limit, sent or decompressed.
+
+        :return: the frames type, flags, request id and payload.
+        """
+        header = await self.receive_exactly(connection, Frame.header.size)
+        frame_type, flags, request, size = Frame.header.unpack(header)
+        if size > Frame.limit:
+            raise Errors.FrameTooLarge(f"frame for request {request} has {size} bytes, at most {Frame.limit} allowed.")
+        payload = await self.compression.decompress(await self.receive_exactly(connection, size), flags, Frame.limit)
+        logger.debug("received frame (%s) for request %s with %s bytes.", frame_type, request, size)
+        return frame_type, flags, request, payload
 
     async def authenticate(self, connection: socket.socket) -> None:
         raise NotImplementedError()
@@ -0,0 +1,359 @@
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+import asyncio
+import errno
+import logging
+import os
+import pwd
+import resource
+import shutil
+import signal
+import subprocess
+
+
+logger = logging.getLogger(__name__)
+
+# sets rlimits and then executes a program, part of util-linux so it is there on every debian, see limited
+prlimit = shutil.which("prlimit")
+# the user the sources are compiled and run as when the server runs as root, a name or a uid,
+# so what the server keeps between sources (the artifact cache, the go build cache) is not theirs to write to.
+# can be changed with this environment variable
+sandbox_variable = "CODESCORD_SANDBOX_USER"
+sandbox_user = "nobody"
+
+
+class Process:
+    """
+    a child process that is reaped with wait4 so what it cost is known once it has exited.
+
+    looks like an asyncio.subprocess.Process to Codescord.Common.languages.communicate.
+    asyncio reaps its own children with waitpid which throws away the resource usage,
+    so the children of the server are started and reaped here instead.
+    the child is reaped in the background as soon as it exits, even if nothing waits for it anymore.
+    the child leads its own session and process group so it can be killed together with everything it started.
+
+    :attr pid: the process id of the child.
+    :attr stdout: reads what the child writes to stdout.
+    :attr stderr: reads what the child writes to stderr.
+    :attr returncode: the exit code, None while the child runs.
+    :attr usage: the user and system cpu seconds and the peak resident memory in bytes of the child,
+        None while the child runs.
+    """
+    def __init__(self, popen: subprocess.Popen, stdout: asyncio.StreamReader, stderr: asyncio.StreamReader) -> None:
+        """
+        :param popen: the started child.
+        :param stdout: reads what the child writes to stdout.
+        :param stderr: reads what the child writes to stderr.
+
+        :attr popen: the started child.
+        :attr reaper: the task reaping the child.
+        """
+        self.popen = popen
+        self.pid = popen.pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: Optional[int] = None
+        self.usage: Optional[Tuple[float, float, int]] = None
+        self.reaper = asyncio.create_task(self.reap())
+
+    async def reap(self) -> None:
+        """
+        waits for the child to exit and reaps it.
+
+        the child is watched with a pidfd where the kernel supports it, otherwise a thread waits for it.
+
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            descriptor = os.pidfd_open(self.pid)
+        except (AttributeError, OSError):
+            _, status, rusage = await loop.run_in_executor(None, os.wait4, self.pid, 0)
+        else:
+            exited = loop.create_future()
+            loop.add_reader(descriptor, lambda: exited.done() or exited.set_result(None))
+            try:
+                await exited
+            finally:
+                loop.remove_reader(descriptor)
+                os.close(descriptor)
+            _, status, rusage = os.wait4(self.pid, 0)
+        self.returncode = self.popen.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is in kilobytes on linux
+        self.usage = rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss * 1024
+
+    async def wait(self) -> int:
+        """
+        waits for the child to exit.
+
+        :return: the exit code, negative if it was killed by a signal.
+        """
+        await asyncio.shield(self.reaper)
+        return self.returncode
+
+    async def communicate(self) -> Tuple[bytes, bytes]:
+        """
+        reads all of stdout and stderr and waits for the child to exit.
+
+        :return: the stdout and stderr of the child.
+        """
+        stdout, stderr = await asyncio.gather(self.stdout.read(), self.stderr.read())
+        await self.wait()
+        return stdout, stderr
+
+    def kill(self) -> None:
+        """
+        kills the child and everything in its process group.
+
+        :return: None
+        """
+        if self.returncode is None:
+            try:
+                os.killpg(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+
+class Supervisor:
+    """
+    keeps track of the processes started for each source and kills what is left of them once the source is done.
+
+    asyncio.wait_for only cancels the coroutine processing a source, the processes it started would keep running.
+    every process is started in its own process group (see Process) so when the source is done, finished,
+    timed out or cancelled, the whole group is killed, the compiled program or whatever `go run` or a detached
+    child started included, and then reaped.
+    processes that left their group (a new session) can not be found again and are not killed.
+
+    in the container the server is pid 1 so the orphans of killed processes are handed to it,
+    those are reaped here as well or they would be left as zombies.
+
+    :attr current: the processes of the source being processed, set by supervise.
+    """
+    current: ContextVar[Optional[Set]] = ContextVar("processes", default=None)
+
+    def __init__(self) -> None:
+        """
+        :attr processes: the processes that might still be running.
+        :attr killed: how many process groups that have been killed.
+        :attr leaked: how many killed process groups that still had processes left a moment later.
+        """
+        self.processes: Set = set()
+        self.killed = 0
+        self.leaked = 0
+
+    def track(self, process) -> None:
+        """
+        keeps track of a process started for the source being processed.
+
+        :param process: a Process or a Codescord.Common.zygote.ZygoteProcess, it must lead its own process group.
+        :return: None
+        """
+        self.processes.add(process)
+        if (processes := self.current.get()) is not None:
+            processes.add(process)
+
+    @property
+    def active(self) -> int:
+        """
+        :return: how many of the tracked processes that are still running.
+        """
+        self.processes = {process for process in self.processes if process.returncode is None}
+        return len(self.processes)
+
+    @asynccontextmanager
+    async def supervise(self) -> AsyncIterator[Set]:
+        """
+        tracks the processes started within the context and kills what is left of them when the context is left.
+
+        a source that exited on its own might have left processes running in its group (daemons, detached
+        children), those are killed as well so nothing of a source outlives it in a warm container.
+
+        :return: the processes started so far.
+        """
+        processes = set()
+        token = self.current.set(processes)
+        try:
+            yield processes
+        finally:
+            self.current.reset(token)
+            await self.kill(processes)
+
+    async def kill(self, processes: Set) -> None:
+        """
+        kills the process groups of some processes and reaps them.
+
+        a group that has nothing left in it costs nothing more than the failed kill.
+
+        :param processes: processes from track.
+        :return: None
+        """
+        killed = []
+        for process in processes:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+                killed.append(process)
+            except ProcessLookupError:
+                pass
+        self.killed += len(killed)
+        await asyncio.gather(*(process.wait() for process in processes))
+        if not killed:
+            return
+        # give the kernel a moment to tear the groups down before looking for what is left
+        await asyncio.sleep(0.1)
+        for process in killed:
+            try:
+                while os.waitpid(-process.pid, os.WNOHANG)[0]:
+                    pass
+            except ChildProcessError:
+                pass
+            if not self.running(process.pid):
+                continue
+            self.leaked += 1
+            logger.warning("process group %s is still running after it was killed.", process.pid)
+
+    @staticmethod
+    def running(group: int) -> bool:
+        """
+        checks if anything in a process group is still running.
+
+        killed processes are left as zombies until their parent reaps them, those do not count.
+        without /proc any process in the group counts.
+
+        :param group: the process group id.
+        :return: true if a process in the group is still running.
+        """
+        try:
+            entries = os.listdir("/proc")
+        except OSError:
+            entries = None
+        if entries is None:
+            try:
+                os.killpg(group, 0)
+                return True
+            except ProcessLookupError:
+                return False
+        for entry in filter(str.isdigit, entries):
+            try:
+                with open(f"/proc/{entry}/stat") as stat:
+                    # the name of the process is in parentheses and might contain anything
+                    state, _, pgrp = stat.read().rpartition(")")[2].split()[:3]
+            except OSError:
+                continue
+            if int(pgrp) == group and state != "Z":
+                return True
+        return False
+
+    def __str__(self) -> str:
+        return f"{self.active} active, {self.killed} killed, {self.leaked} leaked"
+
+
+supervisor = Supervisor()
+
+
+def set_limits(limits: Dict[str, int], pid: int = 0) -> None:
+    """
+    sets rlimits on a process, both the soft and the hard limit so they can not be raised again.
+
+    :param limits: names from the resource module mapped to the limit.
+    :param pid: the process, the current one if not given.
+    :return: None
+    """
+    for name, limit in limits.items():
+        resource.prlimit(pid, getattr(resource, name), (limit, limit))
+
+
+def limited(argv: List[str], limits: Dict[str, int], env: Dict[str, str] = None) -> List[str]:
+    """
+    wraps an argv in prlimit from util-linux, it sets the rlimits on itself and then executes the program.
+
+    setting the rlimits in the child with preexec_fn would run python between fork and exec,
+    which can deadlock the child if another thread of the server held a lock when it forked.
+
+    :param argv: the program and its arguments.
+    :param limits: rlimits as names from the resource module mapped to the limit.
+    :param env: the environment the program is looked up with, the one of the server if not given.
+
+    :raises FileNotFoundError: if there is no such program, as starting it without prlimit would.
+
+    :return: the argv that starts the program with the rlimits set.
+    """
+    if shutil.which(argv[0], path=(env or os.environ).get("PATH")) is None:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), argv[0])
+    # RLIMIT_AS is --as, RLIMIT_CPU is --cpu and so on
+    options = [f"--{name[len('RLIMIT_'):].lower()}={limit}:{limit}" for name, limit in limits.items()]
+    return [prlimit, *options, "--", *argv]
+
+
+@lru_cache(maxsize=None)
+def sandbox() -> Optional[Tuple[int, int]]:
+    """
+    the user and group the sources are compiled and run as.
+
+    :return: the uid and gid of the user, None if the server does not run as root and can not change user.
+    """
+    if os.geteuid() != 0:
+        return None
+    user = os.environ.get(sandbox_variable, sandbox_user)
+    try:
+        entry = pwd.getpwuid(int(user)) if user.isdigit() else pwd.getpwnam(user)
+    except KeyError:
+        logger.warning("there is no user %s to run the sources as, they run as root.", user)
+        return None
+    return entry.pw_uid, entry.pw_gid
+
+
+def hand_over(path: Path) -> None:
+    """
+    gives a directory the server made and everything in it to the sandbox user so a compiler can write to it.
+
+    symbolic links are changed themselves, never what they point to.
+
+    :param path: the directory.
+    :return: None
+    """
+    if (user := sandbox()) is None:
+        return
+    os.chown(path, *user)
+    for directory, directories, files in os.walk(path):
+        for name in directories + files:
+            os.chown(os.path.join(directory, name), *user, follow_symlinks=False)
+
+
+async def spawn(argv: List[str], cwd: Path = None, env: Dict[str, str] = None,
+                limits: Dict[str, int] = None, user: Tuple[int, int] = None) -> Process:
+    """
+    starts a child process with its stdout and stderr piped and nothing on stdin.
+
+    the child is tracked by the supervisor as a process of the source being processed.
+
+    :param argv: the program and its arguments.
+    :param cwd: the directory to run the child in.
+    :param env: the environment of the child, the one of the server if not given.
+    :param limits: rlimits for the child as names from the resource module mapped to the limit.
+    :param user: the uid and gid to run the child as, see sandbox. the user of the server if not given.
+    :return: the started child.
+    """
+    loop = asyncio.get_running_loop()
+    uid, gid = user or (None, None)
+    if limits and prlimit:
+        argv = limited(argv, limits, env)
+    popen = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             cwd=cwd, env=env, start_new_session=True,
+                             user=uid, group=gid, extra_groups=[] if user else None)
+    if limits and not prlimit:
+        # without prlimit the rlimits are set from the outside, the child might already be running by then
+        try:
+            set_limits(limits, popen.pid)
+        except ProcessLookupError:
+            pass
+    readers = []
+    for pipe in (popen.stdout, popen.stderr):
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+        readers.append(reader)
+    process = Process(popen, *readers)
+    supervisor.track(process)
+    return process
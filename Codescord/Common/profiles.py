@@ -0,0 +1,118 @@
+from typing import Dict, Optional
+from contextvars import ContextVar
+from .protocol import Protocol
+import struct
+
+
+class Profile:
+    """
+    the limits a language runs under on the server.
+
+    the compile and run stages of a source have their own timeout so a slow compiler does not eat
+    the time of the program. the memory and cpu limits are set as rlimits on every process of the source.
+    the compilers get limits of their own as a compiler needs other limits than the program it makes.
+    runtimes that reserve a lot of address space up front (the jvm, dotnet, go, node) can not run
+    with an address space limit and are only held back by the timeouts.
+    compilers that keep a server running between builds (roslyn and msbuild for c#) are not given a cpu limit,
+    the server would be killed once all the builds together used it up.
+    the concurrency is how many sources of the language a server processes at once,
+    the others wait for their turn without holding up sources of other languages.
+
+    the timeouts are decided by the server and told to the client with every result
+    instead of being part of Protocol, so changing them does not change the protocol fingerprint.
+    the compile limits are not told to the client.
+
+    :attr packer: the wire format of a profile, see pack.
+    """
+    packer = struct.Struct("!ddQQI")
+
+    def __init__(self, compile_timeout: float = Protocol.timeout, run_timeout: float = Protocol.timeout,
+                 memory: Optional[int] = None, cpu: Optional[int] = None, concurrency: int = 4,
+                 compile_memory: Optional[int] = None, compile_cpu: Optional[int] = None) -> None:
+        """
+        :param compile_timeout: the most seconds compiling a source may take.
+        :param run_timeout: the most seconds running a source may take.
+        :param memory: the most bytes of address space a process may have (RLIMIT_AS), no limit if None.
+        :param cpu: the most cpu seconds a process may use (RLIMIT_CPU), no limit if None.
+        :param concurrency: how many sources of the language are processed at once.
+        :param compile_memory: the same as memory but for the compiler, no limit if None.
+        :param compile_cpu: the same as cpu but for the compiler, no limit if None.
+
+        :attr compile_timeout: the most seconds compiling a source may take.
+        :attr run_timeout: the most seconds running a source may take.
+        :attr memory: the most bytes of address space a process may have (RLIMIT_AS), no limit if None.
+        :attr cpu: the most cpu seconds a process may use (RLIMIT_CPU), no limit if None.
+        :attr concurrency: how many sources of the language are processed at once.
+        :attr compile_memory: the same as memory but for the compiler, no limit if None.
+        :attr compile_cpu: the same as cpu but for the compiler, no limit if None.
+        """
+        self.compile_timeout = compile_timeout
+        self.run_timeout = run_timeout
+        self.memory = memory
+        self.cpu = cpu
+        self.concurrency = concurrency
+        self.compile_memory = compile_memory
+        self.compile_cpu = compile_cpu
+
+    @staticmethod
+    def rlimits(memory: Optional[int], cpu: Optional[int]) -> Dict[str, int]:
+        """
+        :param memory: the address space limit, no limit if None.
+        :param cpu: the cpu time limit, no limit if None.
+        :return: the limits as names from the resource module mapped to the limit.
+        """
+        limits = {"RLIMIT_AS": memory, "RLIMIT_CPU": cpu}
+        return {name: limit for name, limit in limits.items() if limit is not None}
+
+    @property
+    def limits(self) -> Dict[str, int]:
+        """
+        :return: the rlimits of the processes of the run stage as names from the resource module mapped to the limit.
+        """
+        return self.rlimits(self.memory, self.cpu)
+
+    @property
+    def compile_limits(self) -> Dict[str, int]:
+        """
+        :return: the rlimits of the compiler as names from the resource module mapped to the limit.
+        """
+        return self.rlimits(self.compile_memory, self.compile_cpu)
+
+    def pack(self) -> bytes:
+        """
+        :return: the profile packed to be sent along with a result, 0 is no limit.
+        """
+        return self.packer.pack(self.compile_timeout, self.run_timeout, self.memory or 0, self.cpu or 0,
+                                self.concurrency)
+
+    @classmethod
+    def unpack(cls, payload: bytes) -> "Profile":
+        """
+        :param payload: a profile packed with pack.
+        :return: the unpacked profile.
+        """
+        compile_timeout, run_timeout, memory, cpu, concurrency = cls.packer.unpack(payload)
+        return cls(compile_timeout, run_timeout, memory or None, cpu or None, concurrency)
+
+    def __str__(self) -> str:
+        memory = f"{self.memory >> 20}MB" if self.memory else "unlimited"
+        return (f"compile {self.compile_timeout:g}s, run {self.run_timeout:g}s, memory {memory}, "
+                f"cpu {f'{self.cpu}s' if self.cpu else 'unlimited'}, {self.concurrency} at once")
+
+
+# the profiles of the languages by their name in Codescord.Common.languages.registry
+profiles: Dict[str, Profile] = {
+    "python": Profile(memory=2 << 30, cpu=Protocol.timeout),
+    "javascript": Profile(cpu=Protocol.timeout),
+    "php": Profile(memory=1 << 30, cpu=Protocol.timeout),
+    "c": Profile(memory=1 << 30, cpu=Protocol.timeout, compile_memory=2 << 30, compile_cpu=Protocol.timeout),
+    "cpp": Profile(memory=1 << 30, cpu=Protocol.timeout, compile_memory=2 << 30, compile_cpu=Protocol.timeout),
+    "go": Profile(concurrency=2, compile_cpu=Protocol.timeout),
+    "java": Profile(concurrency=2, compile_cpu=Protocol.timeout),
+    "cs": Profile(concurrency=1),
+}
+# the profile of a language without one of its own
+default = Profile()
+
+# the profile of the source being processed, set by Codescord.Server.server.Server.execute
+current: ContextVar[Profile] = ContextVar("profile", default=default)
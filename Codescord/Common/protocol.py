@@ -1,3 +1,9 @@
+from typing import List, Tuple
+from functools import lru_cache
+import struct
+import zlib
+
+
 class Protocol:
     """
     this is the communication protocol that is expected to be the same on the client and the server.
@@ -36,11 +42,13 @@ class Protocol:
         text = 22
 
     @classmethod
+    @lru_cache(maxsize=None)
     def get_protocol(cls) -> str:
         """
         generates a string that represents the protocol.
 
         the server can compare the clients and its own protocol to make sure they match.
+        the string is only generated on the first call, the protocol never changes while running.
 
         :return: protocol as text.
         """
@@ -57,3 +65,148 @@ class Protocol:
                 attrs.append(f"{attr}={value}")
         attrs.sort()
         return ":".join(attrs)
+
+
+class Frame:
+    """
+    the v2 framed wire protocol.
+
+    every message is a fixed size header (type, flags, request, length) followed by `length` bytes of payload.
+    the type of a frame is one of the codes in Protocol.Status or Frame.Type.
+    frames are never acknowledged on their own, the recipient only answers when it has something to say.
+
+    the request id lets many requests be in flight on the same connection at once.
+    the server answers a request with frames carrying the same request id, in whatever order they finish.
+    request id 0 is reserved for frames about the connection itself such as close.
+
+    the framed protocol is selected during the authentication handshake.
+    the client sends Frame.negotiate as a v1 instruction, a server that speaks v2 answers with success
+    and both sides switch to frames. an older server answers with Protocol.Status.not_implemented
+    and the client falls back to the v1 protocol on the same connection.
+
+    right after the success the server sends an authenticate frame with its fingerprint, framing version
+    and capabilities (see Frame.handshake). the client compares the fingerprint, keeps the capabilities
+    both sides have and answers with its own authenticate frame carrying the agreed capabilities.
+    the client does not wait for anything after that and can start sending requests right away,
+    so the whole negotiation costs a single round trip.
+
+    kept outside of Protocol so the v1 protocol string from Protocol.get_protocol() stays the same
+    as the one in older docker images.
+    """
+    version = 2
+    negotiate = 23
+
+    header = struct.Struct("!BBII")
+    field = struct.Struct("!I")
+    handshake = struct.Struct("!IHI")
+    backlog = struct.Struct("!II")
+    # the most bytes a payload may take up, sent and after decompression, a batch of results at most
+    limit = 1 << 26
+
+    class Type:
+        """
+        frame types that only exists in the framed protocol.
+
+        batch: several sources packed in one frame, answered with one frame with the result for each source.
+        queued: sent for a request that has to wait because the server is busy, before its result.
+            the payload is how many sources are waiting and how many the server processes at once
+            packed with Frame.backlog.
+        """
+        batch = 24
+        queued = 25
+
+    class Flags:
+        """
+        bits for the flags of a frame.
+
+        stream: set on a file request to have the output sent back while the source is running.
+        more: set on an answer that will be followed by more frames for the same request.
+        zlib: the payload is compressed with zlib.
+        lzma: the payload is compressed with lzma.
+        usage: set on a result, the payload is the output followed by what processing the source cost
+            (Codescord.Common.usage.Usage) and the limits it ran under (Codescord.Common.profiles.Profile)
+            packed as fields, each only if its capability was agreed on.
+        """
+        stream = 1
+        more = 2
+        zlib = 4
+        lzma = 8
+        usage = 16
+
+    class Capabilities:
+        """
+        bits for the optional features of the framed protocol.
+
+        batching: batch requests are understood.
+        streaming: file requests can have their output streamed.
+        multiplexing: several requests can be in flight on the same connection at once.
+        zlib: payloads can be compressed with zlib.
+        lzma: payloads can be compressed with lzma.
+        usage: results come with what processing the source cost.
+        limits: results come with the limits the source ran under and a timeout with the stage that timed out.
+        backpressure: requests that have to wait for the server are told so with a queued frame.
+        """
+        batching = 1
+        streaming = 2
+        multiplexing = 4
+        zlib = 8
+        lzma = 16
+        usage = 32
+        limits = 64
+        backpressure = 128
+
+    # everything both sides must agree on, the optional features are negotiated with the capabilities.
+    fingerprint = zlib.crc32(f"{Protocol.get_protocol()}:header={header.format}:version={version}".encode("utf-8"))
+    capabilities = (Capabilities.batching | Capabilities.streaming | Capabilities.multiplexing
+                    | Capabilities.zlib | Capabilities.lzma | Capabilities.usage
+                    | Capabilities.limits | Capabilities.backpressure)
+
+    @classmethod
+    def pack_handshake(cls, capabilities: int) -> bytes:
+        """
+        packs the payload of an authenticate frame.
+
+        :param capabilities: the capabilities to offer or agree on.
+        :return: the packed fingerprint, framing version and capabilities.
+        """
+        return cls.handshake.pack(cls.fingerprint, cls.version, capabilities)
+
+    @classmethod
+    def unpack_handshake(cls, payload: bytes) -> Tuple[int, int, int]:
+        """
+        unpacks the payload of an authenticate frame.
+
+        :param payload: the payload packed with pack_handshake.
+        :return: the fingerprint, framing version and capabilities.
+        """
+        return cls.handshake.unpack(payload)
+
+    @classmethod
+    def pack_fields(cls, *fields: bytes) -> bytes:
+        """
+        packs several byte blobs into a single payload.
+
+        each field is prefixed with its length so the fields can be separated again with unpack_fields.
+
+        :param fields: the byte blobs to pack.
+        :return: the packed payload.
+        """
+        return b"".join(cls.field.pack(len(field)) + field for field in fields)
+
+    @classmethod
+    def unpack_fields(cls, payload: bytes) -> List[bytes]:
+        """
+        unpacks a payload packed with pack_fields.
+
+        :param payload: the packed payload.
+        :return: the fields in the order they were packed.
+        """
+        fields = []
+        offset = 0
+        with memoryview(payload) as view:
+            while offset < len(view):
+                size, = cls.field.unpack_from(view, offset)
+                offset += cls.field.size
+                fields.append(bytes(view[offset:offset + size]))
+                offset += size
+        return fields
@@ -0,0 +1,94 @@
+from typing import Optional, Tuple
+from contextvars import ContextVar
+import struct
+import time
+
+
+class Usage:
+    """
+    what processing a single source cost the server.
+
+    the processes started for the source add what they cost while it is processed, see record.
+    the cpu time and memory are only known for processes the server reaps itself,
+    compilations in a compiler server kept running between sources (javac, roslyn) only count their wall time.
+
+    :attr packer: the wire format of a usage, see pack.
+    """
+    packer = struct.Struct("!ddddddQ")
+
+    def __init__(self, wall: float = 0, queued: float = 0, compile: float = 0, run: float = 0,
+                 user: float = 0, system: float = 0, max_rss: int = 0) -> None:
+        """
+        :param wall: seconds from the source arriving to its result being ready.
+        :param queued: seconds the source waited for its turn before it was processed.
+        :param compile: seconds spent compiling the source.
+        :param run: seconds spent running the source.
+        :param user: cpu seconds spent in user mode by the processes of the source.
+        :param system: cpu seconds spent in the kernel by the processes of the source.
+        :param max_rss: the peak resident memory of the largest process of the source in bytes.
+
+        :attr wall: seconds from the source arriving to its result being ready.
+        :attr queued: seconds the source waited for its turn before it was processed.
+        :attr compile: seconds spent compiling the source.
+        :attr run: seconds spent running the source.
+        :attr user: cpu seconds spent in user mode by the processes of the source.
+        :attr system: cpu seconds spent in the kernel by the processes of the source.
+        :attr max_rss: the peak resident memory of the largest process of the source in bytes.
+        """
+        self.wall = wall
+        self.queued = queued
+        self.compile = compile
+        self.run = run
+        self.user = user
+        self.system = system
+        self.max_rss = max_rss
+
+    def add(self, stage: str, wall: float, usage: Optional[Tuple[float, float, int]]) -> None:
+        """
+        adds what a process cost.
+
+        :param stage: compile or run.
+        :param wall: how many seconds the process took.
+        :param usage: the user and system cpu seconds and the peak resident memory of the process if known.
+        :return: None
+        """
+        setattr(self, stage, getattr(self, stage) + wall)
+        if usage:
+            user, system, max_rss = usage
+            self.user += user
+            self.system += system
+            self.max_rss = max(self.max_rss, max_rss)
+
+    def pack(self) -> bytes:
+        """
+        :return: the usage packed to be sent along with a result.
+        """
+        return self.packer.pack(self.wall, self.queued, self.compile, self.run, self.user, self.system, self.max_rss)
+
+    @classmethod
+    def unpack(cls, payload: bytes) -> "Usage":
+        """
+        :param payload: a usage packed with pack.
+        :return: the unpacked usage.
+        """
+        return cls(*cls.packer.unpack(payload))
+
+    def __str__(self) -> str:
+        return f"took {self.wall:.1f}s, queued {self.queued:.1f}s, {self.max_rss / (1 << 20):.0f}MB"
+
+
+# the usage of the source being processed, set by Codescord.Server.server.Server.execute
+current: ContextVar[Optional[Usage]] = ContextVar("usage", default=None)
+
+
+def record(stage: str, started: float, process=None) -> None:
+    """
+    adds what a process cost to the usage of the source being processed, if any.
+
+    :param stage: compile or run.
+    :param started: time.perf_counter() from when the process was started.
+    :param process: the process, its cpu time and memory are added if it has a usage.
+    :return: None
+    """
+    if (usage := current.get()) is not None:
+        usage.add(stage, time.perf_counter() - started, getattr(process, "usage", None))
@@ -0,0 +1,138 @@
+from typing import AsyncIterator, List, Optional, Set, Tuple, Union
+from contextlib import asynccontextmanager
+from functools import partial
+from pathlib import Path
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+
+
+logger = logging.getLogger(__name__)
+
+# where the workspaces are made, a tmpfs mounted in the container by the client
+variable = "CODESCORD_WORKSPACES"
+container_workspaces = "/Codescord/workspaces"
+# the size of the tmpfs, compiled programs are run from it so it must be mounted with exec
+size = "512m"
+
+
+class Workspaces:
+    """
+    hands out the scratch directories sources are written, compiled and run in.
+
+    the directories are made in memory (a tmpfs mounted by the client) instead of on the overlay filesystem
+    of the container where writing and removing files is slow when many sources run at once.
+    a directory is emptied after its source is done and handed out again instead of removed and made anew.
+    the emptying happens in the background so the result is sent without waiting for it.
+    a directory that could not be emptied, something still running in it might be writing to it, is removed instead.
+    """
+    def __init__(self, root: Union[Path, str] = None, spares: int = 16, owner: Tuple[int, int] = None) -> None:
+        """
+        :param root: where to make the directories, the temporary directory of the system if not given.
+        :param spares: the most empty directories to keep for later sources.
+        :param owner: the uid and gid the directories are given to, see Codescord.Common.processes.sandbox.
+
+        :attr root: where to make the directories.
+        :attr spares: the most empty directories to keep for later sources.
+        :attr owner: the uid and gid the directories are given to, None to keep them the servers own.
+        :attr directory: the directory of this server below root, made when the first workspace is needed.
+        :attr free: the empty directories ready to be handed out.
+        :attr cleaning: the tasks emptying directories in the background.
+        :attr created: how many directories that had to be made.
+        :attr recycled: how many times an emptied directory was handed out again.
+        """
+        self.root = Path(root) if root else Path(tempfile.gettempdir())
+        self.spares = spares
+        self.owner = owner
+        self.directory: Optional[Path] = None
+        self.free: List[Path] = []
+        self.cleaning: Set[asyncio.Task] = set()
+        self.created = 0
+        self.recycled = 0
+
+    def create(self) -> Path:
+        """
+        :return: a new empty directory.
+        """
+        if self.directory is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self.directory = Path(tempfile.mkdtemp(prefix="codescord-", dir=self.root))
+            if self.owner:
+                # the owner may pass through to its own directories but not list the others
+                os.chmod(self.directory, 0o711)
+        self.created += 1
+        workspace = Path(tempfile.mkdtemp(dir=self.directory))
+        if self.owner:
+            os.chown(workspace, *self.owner)
+        return workspace
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Path]:
+        """
+        hands out an empty directory for the duration of the context.
+
+        :return: the empty directory.
+        """
+        if self.free:
+            workspace = self.free.pop()
+            self.recycled += 1
+        else:
+            workspace = self.create()
+        try:
+            yield workspace
+        finally:
+            task = asyncio.create_task(self.recycle(workspace))
+            self.cleaning.add(task)
+            task.add_done_callback(self.cleaning.discard)
+
+    @staticmethod
+    def empty(workspace: Path) -> bool:
+        """
+        removes everything in a directory.
+
+        :param workspace: the directory to empty.
+        :return: true if the directory is empty afterwards.
+        """
+        os.chmod(workspace, 0o700)
+        for entry in workspace.iterdir():
+            if entry.is_dir() and not entry.is_symlink():
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                entry.unlink(missing_ok=True)
+        return not any(workspace.iterdir())
+
+    async def recycle(self, workspace: Path) -> None:
+        """
+        empties a directory in a thread and keeps it for later sources if there is room for it.
+
+        :param workspace: a directory handed out by acquire.
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            empty = await loop.run_in_executor(None, self.empty, workspace)
+        except OSError as e:
+            logger.debug("could not empty workspace %s: %s", workspace, e)
+            empty = False
+        if empty and len(self.free) < self.spares:
+            self.free.append(workspace)
+        else:
+            await loop.run_in_executor(None, partial(shutil.rmtree, workspace, ignore_errors=True))
+
+    def close(self) -> None:
+        """
+        removes all the directories.
+
+        :return: None
+        """
+        for task in self.cleaning:
+            task.cancel()
+        if self.directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        self.free.clear()
+
+    def __str__(self) -> str:
+        return f"{self.created} created, {self.recycled} recycled"
+
@@ -0,0 +1,343 @@
+"""
+a python process that has already imported the heavy modules and forks a child for every python source.
+
+runs as its own script, `python3 zygote.py <socket> <module>...`, and only imports the standard library so the
+children do not get anything from Codescord. Zygote starts it from the server and asks it for children.
+
+a request is a json line sent over the unix socket together with the stdin, stdout and stderr of the child
+as file descriptors. the zygote answers with a json line with the pid of the child and
+another one with its exit code and resource usage once the child is done.
+"""
+from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+import asyncio
+import atexit
+import importlib
+import json
+import os
+import random
+import resource
+import runpy
+import select
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import traceback
+
+
+def run(request: dict) -> int:
+    """
+    runs a python source in a forked child the same way `python3 file args` would.
+
+    :param request: the file, argv, working directory, environment, resource limits and user of the child.
+    :return: the exit code, an uncaught exception is printed and gives 1 like the interpreter does.
+    """
+    try:
+        os.chdir(request["cwd"])
+        os.environ.update(request["env"])
+        for limit, value in request["limits"].items():
+            resource.setrlimit(getattr(resource, limit), (value, value))
+        if request.get("user"):
+            uid, gid = request["user"]
+            os.setgroups([])
+            os.setgid(gid)
+            os.setuid(uid)
+    except Exception as e:
+        print(f"could not prepare the python process: {type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    tempfile.tempdir = None
+    sys.argv = request["argv"]
+    sys.path[0] = str(Path(request["file"]).parent)
+    # the children would otherwise all continue from the same random state as the zygote
+    random.seed()
+    if "numpy" in sys.modules:
+        sys.modules["numpy"].random.seed()
+    try:
+        runpy.run_path(request["file"], run_name="__main__")
+        # the interpreter waits for threads that are not daemons before it exits, os._exit would not
+        for thread in threading.enumerate():
+            if thread is not threading.main_thread() and not thread.daemon:
+                thread.join()
+        return 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException as e:
+        frames = traceback.extract_tb(e.__traceback__)
+        skip = next((index for index, frame in enumerate(frames) if frame.filename == request["file"]), 0)
+        print("Traceback (most recent call last):", file=sys.stderr)
+        print("".join(traceback.format_list(frames[skip:])), end="", file=sys.stderr)
+        print("".join(traceback.format_exception_only(type(e), e)), end="", file=sys.stderr)
+        return 1
+    finally:
+        atexit._run_exitfuncs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def answer(connection: socket.socket, message: dict) -> None:
+    """
+    sends an answer to the server, the server might have given up on the child already.
+
+    :param connection: the connection the child was asked for on.
+    :param message: the answer.
+    :return: None
+    """
+    try:
+        connection.sendall(json.dumps(message).encode() + b"\n")
+    except OSError:
+        pass
+
+
+def serve(path: str, preload: List[str]) -> None:
+    """
+    imports the preload modules and forks a child for every request until the server goes away.
+
+    the zygote is single threaded, it waits for new requests and exited children at the same time
+    by waking up on SIGCHLD.
+
+    :param path: the unix socket to listen on.
+    :param preload: the modules to import before forking.
+    :return: None
+    """
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"could not preload {module}: {e}", file=sys.stderr)
+
+    wakeup, wakeup_writer = os.pipe()
+    os.set_blocking(wakeup_writer, False)
+    signal.set_wakeup_fd(wakeup_writer)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+
+    listener = socket.socket(socket.AF_UNIX)
+    listener.bind(path)
+    listener.listen()
+    print("ready", flush=True)
+
+    children: Dict[int, socket.socket] = {}
+    while True:
+        readable, _, _ = select.select([listener, wakeup, sys.stdin], [], [])
+        if sys.stdin in readable and not sys.stdin.buffer.read1(1):
+            break
+        if wakeup in readable:
+            os.read(wakeup, 1024)
+            while children:
+                pid, status, usage = os.wait4(-1, os.WNOHANG)
+                if not pid:
+                    break
+                if connection := children.pop(pid, None):
+                    answer(connection, {"code": os.waitstatus_to_exitcode(status),
+                                        "usage": (usage.ru_utime, usage.ru_stime, usage.ru_maxrss * 1024)})
+                    connection.close()
+        if listener in readable:
+            connection, _ = listener.accept()
+            try:
+                message, descriptors, _, _ = socket.recv_fds(connection, 1 << 16, 3)
+                request = json.loads(message)
+            except (OSError, ValueError):
+                connection.close()
+                continue
+            sys.stdout.flush()
+            sys.stderr.flush()
+            started, started_writer = os.pipe()
+            if not (pid := os.fork()):
+                code = 1
+                try:
+                    # the server kills the process group of the child, it has to exist before the pid is answered
+                    os.setsid()
+                    os.close(started_writer)
+                    os.close(started)
+                    signal.set_wakeup_fd(-1)
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    for other in (listener, connection, *children.values()):
+                        other.close()
+                    for descriptor in (wakeup, wakeup_writer):
+                        os.close(descriptor)
+                    for target, descriptor in enumerate(descriptors):
+                        if descriptor != target:
+                            os.dup2(descriptor, target)
+                            os.close(descriptor)
+                    code = run(request)
+                except BaseException as e:
+                    os.write(2, f"the python process failed: {type(e).__name__}: {e}\n".encode())
+                finally:
+                    # the child must never get back to the loop of the zygote
+                    os._exit(code)
+            os.close(started_writer)
+            # the child closes its end once it leads its own session, or dies
+            os.read(started, 1)
+            os.close(started)
+            for descriptor in descriptors:
+                os.close(descriptor)
+            answer(connection, {"pid": pid})
+            children[pid] = connection
+
+
+class ZygoteProcess:
+    """
+    a child forked by the zygote that looks like an asyncio.subprocess.Process to communicate.
+
+    :attr pid: the process id of the child.
+    :attr stdout: reads what the child writes to stdout.
+    :attr stderr: reads what the child writes to stderr.
+    :attr returncode: the exit code, None while the child runs.
+    :attr usage: the user and system cpu seconds and the peak resident memory in bytes of the child,
+        None while the child runs or if it is not known.
+    """
+    def __init__(self, pid: int, stdout: asyncio.StreamReader, stderr: asyncio.StreamReader,
+                 answers: asyncio.StreamReader, connection: asyncio.StreamWriter) -> None:
+        """
+        :param pid: the process id of the child.
+        :param stdout: reads what the child writes to stdout.
+        :param stderr: reads what the child writes to stderr.
+        :param answers: reads the answers from the zygote about the child.
+        :param connection: the connection to the zygote.
+
+        :attr answers: the answers from the zygote about the child.
+        :attr connection: the connection to the zygote, closed once the child is done.
+        """
+        self.pid = pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.answers = answers
+        self.connection = connection
+        self.returncode: Optional[int] = None
+        self.usage: Optional[Tuple[float, float, int]] = None
+
+    async def wait(self) -> int:
+        """
+        waits for the child to exit.
+
+        :return: the exit code, negative if it was killed by a signal.
+        """
+        if self.returncode is None:
+            if message := await self.answers.readline():
+                message = json.loads(message)
+                self.returncode, self.usage = message["code"], tuple(message["usage"])
+            else:
+                self.returncode = -signal.SIGKILL
+            self.connection.close()
+        return self.returncode
+
+    def kill(self) -> None:
+        """
+        kills the child and everything in its process group.
+
+        :return: None
+        """
+        if self.returncode is None:
+            try:
+                os.killpg(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+
+class Zygote:
+    """
+    starts the zygote and asks it for children, used by Codescord.Common.languages.python_spawner.
+
+    the zygote is started on the first request and started again if it has died.
+    """
+    def __init__(self, preload: List[str]) -> None:
+        """
+        :param preload: the modules the zygote imports before forking.
+
+        :attr preload: the modules the zygote imports before forking.
+        :attr process: the zygote, None until the first request.
+        :attr directory: the private directory of the socket of the zygote.
+        :attr lock: held while the zygote is started.
+        """
+        self.preload = preload
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.directory: Optional[tempfile.TemporaryDirectory] = None
+        self.lock = asyncio.Lock()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory.name, "zygote.sock")
+
+    async def start(self) -> None:
+        """
+        starts the zygote if its not running and waits until it has imported the preload modules.
+
+        :raises ConnectionError: if the zygote died while starting.
+
+        :return: None
+        """
+        async with self.lock:
+            if self.process and self.process.returncode is None:
+                return
+            self.directory = tempfile.TemporaryDirectory()
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, __file__, self.path, *self.preload,
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+            if await self.process.stdout.readline() != b"ready\n":
+                raise ConnectionResetError("the python zygote died while starting.")
+
+    async def spawn(self, file: Path, args: List[str], scratch: Path,
+                    limits: Dict[str, int] = None, user: Tuple[int, int] = None) -> ZygoteProcess:
+        """
+        forks a child that runs a python source.
+
+        :param file: the python source.
+        :param args: the arguments given to the source.
+        :param scratch: the working directory and TMPDIR of the child, also its home if it is given a user.
+        :param limits: resource limits for the child as names from the resource module mapped to the limit.
+        :param user: the uid and gid the child switches to, see Codescord.Common.processes.sandbox.
+        :return: the running child.
+        """
+        await self.start()
+        loop = asyncio.get_running_loop()
+        environment = {"TMPDIR": str(scratch), **({"HOME": str(scratch)} if user else {})}
+        request = json.dumps({
+            "file": str(file), "argv": [str(file), *args], "cwd": str(scratch),
+            "env": environment, "limits": limits or {}, "user": user}).encode()
+
+        stdout, stdout_writer = os.pipe()
+        stderr, stderr_writer = os.pipe()
+        stdin = os.open(os.devnull, os.O_RDONLY)
+        connection = socket.socket(socket.AF_UNIX)
+        connection.setblocking(False)
+        try:
+            await loop.sock_connect(connection, self.path)
+            while True:
+                try:
+                    socket.send_fds(connection, [request], [stdin, stdout_writer, stderr_writer])
+                    break
+                except BlockingIOError:
+                    writable = loop.create_future()
+                    loop.add_writer(connection, writable.set_result, None)
+                    try:
+                        await writable
+                    finally:
+                        loop.remove_writer(connection)
+        except BaseException:
+            connection.close()
+            for descriptor in (stdout, stderr):
+                os.close(descriptor)
+            raise
+        finally:
+            for descriptor in (stdin, stdout_writer, stderr_writer):
+                os.close(descriptor)
+
+        readers = []
+        for descriptor in (stdout, stderr):
+            reader = asyncio.StreamReader()
+            await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(descriptor, "rb", 0))
+            readers.append(reader)
+        answers, writer = await asyncio.open_unix_connection(sock=connection)
+        answer = await answers.readline()
+        if not answer:
+            writer.close()
+            raise ConnectionResetError("the python zygote died.")
+        return ZygoteProcess(json.loads(answer)["pid"], *readers, answers, writer)
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,146 @@
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from contextlib import asynccontextmanager
+from collections import deque
+from pathlib import Path
+import asyncio
+import logging
+import math
+import os
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# told how many sources are waiting when a source has to wait for a slot
+Queued = Callable[[int], Awaitable[None]]
+
+
+def quota() -> Optional[float]:
+    """
+    reads the cpu quota of the cgroup the server runs in, set by for example `docker run --cpus`.
+
+    both cgroup v2 (cpu.max) and cgroup v1 (cpu.cfs_quota_us and cpu.cfs_period_us) are understood.
+
+    :return: how many cores worth of cpu time the server may use, None if there is no quota.
+    """
+    try:
+        limit, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        return None if limit == "max" else int(limit) / int(period)
+    except (OSError, ValueError):
+        pass
+    for directory in ("/sys/fs/cgroup/cpu", "/sys/fs/cgroup/cpu,cpuacct"):
+        try:
+            limit = int(Path(directory, "cpu.cfs_quota_us").read_text())
+            period = int(Path(directory, "cpu.cfs_period_us").read_text())
+        except (OSError, ValueError):
+            continue
+        return None if limit < 0 else limit / period
+    return None
+
+
+def cores() -> int:
+    """
+    the amount of cores the server can keep busy.
+
+    the cores the server may be scheduled on, capped by the cpu quota of its cgroup.
+    os.cpu_count() is the cores of the host and says nothing about the limits of the container.
+
+    :return: the amount of cores, at least 1.
+    """
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+    if (cpus := quota()) is not None:
+        available = min(available, math.ceil(cpus))
+    return max(available, 1)
+
+
+class Scheduler:
+    """
+    bounds how many sources the server processes at once to the cores it has.
+
+    every connection and request is handled in its own task, without a bound several jobs sent to
+    the same container would all start their compilers at once and thrash the cpu.
+    a source takes a slot while it is processed, once every slot is taken the sources wait in a
+    first in first out queue and are handed a slot as soon as one is released.
+    a source that has to wait tells whoever sent it through the callback given to slot,
+    see Codescord.Server.server.Server.backpressure.
+    """
+    def __init__(self, slots: int = None) -> None:
+        """
+        :param slots: how many sources to process at once, the amount of cores if not given.
+
+        :attr slots: how many sources to process at once.
+        :attr running: how many slots that are taken.
+        :attr waiters: the futures of the sources waiting for a slot, first in line first.
+        :attr processed: how many sources that have been given a slot.
+        :attr queued: how many of those that had to wait for it.
+        :attr waited: the seconds the sources have waited for a slot in total.
+        """
+        self.slots = slots or cores()
+        self.running = 0
+        self.waiters: deque = deque()
+        self.processed = 0
+        self.queued = 0
+        self.waited = 0.0
+        logger.info("processing %s sources at once.", self.slots)
+
+    @property
+    def waiting(self) -> int:
+        """
+        :return: how many sources that are waiting for a slot.
+        """
+        return sum(1 for waiter in self.waiters if not waiter.done())
+
+    @asynccontextmanager
+    async def slot(self, queued: Queued = None) -> AsyncIterator[None]:
+        """
+        holds a slot while the context is entered, waits for one to be free if there is none.
+
+        :param queued: awaited with how many sources are waiting (this one included) if the source has to wait.
+        :return: None
+        """
+        started = time.perf_counter()
+        # waiters are only left in line while every slot is taken, see release
+        if self.running < self.slots:
+            self.running += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                if queued:
+                    await queued(self.waiting)
+                await waiter
+            except BaseException:
+                if waiter.done() and not waiter.cancelled():
+                    # the slot was handed over already, pass it on
+                    self.release()
+                else:
+                    waiter.cancel()
+                raise
+            self.queued += 1
+            self.waited += time.perf_counter() - started
+        self.processed += 1
+        try:
+            yield
+        finally:
+            self.release()
+
+    def release(self) -> None:
+        """
+        hands a taken slot to the next source in line or frees it if no source is waiting.
+
+        :return: None
+        """
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.running -= 1
+
+    def __str__(self) -> str:
+        waited = self.waited / self.queued if self.queued else 0
+        return (f"{self.running} of {self.slots} slots taken, {self.waiting} waiting, "
+                f"{self.queued} of {self.processed} queued for {waited:.2f}s on average")
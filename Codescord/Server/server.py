@@ -1,23 +1,48 @@
+from typing import Tuple, Set, Callable, Awaitable, Dict, Optional
 from ..Common.net import Net
 from ..Common.errors import Errors
-from ..Common.protocol import Protocol
-from ..Common.languages import Languages, get_language_map
+from ..Common.protocol import Protocol, Frame
+from ..Common.languages import Language, Stream, get_language_map, output_limit, artifacts, warm_up, communicate
+from ..Common.languages import Placeholders, within
+from ..Common.workspaces import Workspaces
+from ..Common.usage import Usage
+from ..Common.processes import sandbox, supervisor
+from ..Common.profiles import Profile
+from ..Common import workspaces, usage, profiles
+from .scheduler import Scheduler, Queued
 import socket
 import asyncio
 from pathlib import Path
-import tempfile
+import logging
+import os
+import struct
+import time
 from uuid import uuid4
+from functools import partial
 
 
-def setup_socket() -> socket.socket:
+logger = logging.getLogger(__name__)
+
+
+def setup_socket(sockets: str = None) -> socket.socket:
     """
     sets up the server socket for clients to connect to.
 
+    listens on tcp port Net.port unless a directory for unix sockets is given,
+    then a unix socket named Net.socket_name is created in there instead.
+
+    :param sockets: directory to create the unix socket in.
     :return: the generated socket.
     """
-    sock = socket.socket()
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    sock.bind(("", 6090))
+    if sockets:
+        path = Path(sockets).joinpath(Net.socket_name)
+        path.unlink(missing_ok=True)
+        sock = socket.socket(socket.AF_UNIX)
+        sock.bind(str(path))
+    else:
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("", Net.port))
     sock.setblocking(False)
     sock.listen()
     return sock
@@ -26,37 +51,50 @@ def setup_socket() -> socket.socket:
 class Server(Net):
     """
     this server will be living in a docker container started by Discord.Client.
-    the server will be listening on port 6090 for connections.
+    the server will be listening on port 6090 (or a unix socket) for connections.
     once a connection is established the server will expect the client to send some instruction.
     this should always be the instruction to AUTHENTICATE first and should be followed up with a FILE download to
     some source file for some language that will then be executed and a TEXT instruction will be sent back with the
     generated stdout.
     the server should then be told to close down and the Discord.Client will be handling the closing
     of the container when everything have closed gracefully.
+
+    if the client starts with the Frame.negotiate instruction the rest of the connection
+    is handled with the framed v2 protocol instead, see Server.handle_frames.
     """
-    def __init__(self, loop=None):
+    def __init__(self, loop=None, sockets: str = None, output_limit: int = output_limit):
         """
         :param loop: asyncio event loop
+        :param sockets: directory to create a unix socket in, listens on tcp if not given.
+        :param output_limit: the most bytes of output a single source may produce.
 
         :attr socket: the server socket clients connects to
         :attr instructions: a mapping of received instruction from client to how the server is supposed to act.
-        :attr languages: dict of supported programming languages that maps to how to execute said language.
+        :attr frame_instructions: the same as instructions but for requests received with the v2 protocol.
+        :attr languages: the supported languages by their names and aliases, see Codescord.Common.languages.registry.
+        :attr output_limit: the most bytes of output a single source may produce before its process is killed.
+        :attr workspaces: hands out the scratch directories the sources run in.
+        :attr turns: how many sources of each language that may be processed at once, see profile.
+        :attr scheduler: how many sources that may be processed at once in total, see Scheduler.
         """
         super(Server, self).__init__(loop)
-        self.socket = setup_socket()
+        self.socket = setup_socket(sockets)
+        self.output_limit = output_limit
+        self.workspaces = Workspaces(os.environ.get(workspaces.variable), owner=sandbox())
+        self.turns: Dict[str, asyncio.Semaphore] = {}
+        self.scheduler = Scheduler()
 
         self.instructions = {
             Protocol.Status.authenticate: self.authenticate,
             Protocol.Status.file: self.download_source,
         }
 
+        self.frame_instructions = {
+            Protocol.Status.file: self.process_frame,
+            Frame.Type.batch: self.process_batch,
+        }
+
         self.languages = get_language_map()
-        self.languages.update({
-            "py": Languages.python,
-            "c++": Languages.cpp,
-            "js": Languages.javascript,
-            "c#": Languages.cs
-        })
 
     async def authenticate(self, connection: socket.socket) -> None:
         """
@@ -71,23 +109,379 @@ class Server(Net):
 
         :return: None
         """
-        print("authenticating...")
+        logger.debug("authenticating...")
         protocol = await self.download(connection)
         if protocol == Protocol.get_protocol().encode("utf-8"):
             await self.send_int_as_bytes(connection, Protocol.Status.success)
-            print("authenticated.")
+            logger.debug("authenticated.")
         else:
             await self.send_int_as_bytes(connection, Protocol.Status.not_implemented)
             raise Errors.NotImplementedInProtocol()
 
+    async def authenticate_frame(self, reply: Callable[..., Awaitable[None]], payload: bytes) -> int:
+        """
+        the framed counterpart to authenticate.
+
+        the client answers the servers offer from handle_frames with its fingerprint, framing version and the
+        capabilities it agreed on. nothing is sent back if they match so the client never waits for it.
+
+        :param reply: sends a frame in response to the authenticate request, see Server.reply.
+        :param payload: the clients handshake, see Frame.pack_handshake.
+
+        :raises Errors.NotImplementedInProtocol: protocol have been updated but the docker image was never rebuilt.
+
+        :return: the agreed capabilities.
+        """
+        logger.debug("authenticating...")
+        try:
+            fingerprint, version, capabilities = Frame.unpack_handshake(payload)
+        except struct.error:
+            fingerprint, version, capabilities = None, None, 0
+        if fingerprint == Frame.fingerprint and version == Frame.version:
+            logger.debug("authenticated with capabilities %s.", capabilities & Frame.capabilities)
+            return capabilities & Frame.capabilities
+        await reply(Protocol.Status.not_implemented)
+        raise Errors.NotImplementedInProtocol()
+
+    def profile(self, language: str) -> Profile:
+        """
+        :param language: the language of a source.
+        :return: the limits sources of the language run under, see Codescord.Common.profiles.
+        """
+        if language not in self.languages:
+            return profiles.default
+        return profiles.profiles.get(self.languages[language].name, profiles.default)
+
+    def turn(self, language: str) -> asyncio.Semaphore:
+        """
+        :param language: the language of a source.
+        :return: held while a source of the language is processed, shared by every alias of the language.
+        """
+        name = self.languages[language].name
+        if name not in self.turns:
+            self.turns[name] = asyncio.Semaphore(self.profile(language).concurrency)
+        return self.turns[name]
+
+    async def execute(self, language: str, code: bytes, sys_args: str, stream: Stream = None,
+                      cost: Usage = None, queued: Queued = None) -> bytes:
+        """
+        executes some source code as its language.
+
+        the source is saved to a file with the extension of its language in a workspace from self.workspaces
+        and compiled and run in two stages, see stages.
+        the output is cut at self.output_limit bytes while it is read.
+        the workspace is also the scratch directory of the process and is emptied afterwards.
+        the source runs under the profile of its language, it waits for its turn if the language
+        already has as many sources processing as the profile allows and the compile and run stages
+        have their own timeouts.
+        once it is its turn it also waits for a slot from self.scheduler so no more sources are processed
+        at once than there are cores.
+        what the processes started for the source cost is added to `cost`, even if the source times out,
+        and how long it waited before it was processed.
+        once the source is done, finished, timed out or cancelled, every process it started that is still
+        running is killed, see Codescord.Common.processes.Supervisor.
+
+        :param language: the language of the source, must be in self.languages.
+        :param code: the source code.
+        :param sys_args: system arguments given to the program.
+        :param stream: given the output while the source runs, see Codescord.Common.languages.communicate.
+        :param cost: the usage to add what the source cost to.
+        :param queued: awaited with how many sources are waiting if the source has to wait for a slot.
+
+        :raises Errors.ProcessTimedOut: with the stage that took too long, compile or run.
+
+        :return: the result from the execution.
+        """
+        started = time.perf_counter()
+        profile = self.profile(language)
+        tokens = usage.current.set(cost), profiles.current.set(profile)
+        try:
+            async with self.turn(language), self.scheduler.slot(queued), self.workspaces.acquire() as workspace:
+                if cost:
+                    cost.queued = time.perf_counter() - started
+                file = workspace.joinpath(f"{str(uuid4())}.{self.languages[language].extension}")
+                with open(file, "wb") as script:
+                    script.write(code)
+                async with supervisor.supervise():
+                    return await self.stages(self.languages[language], file, sys_args, stream)
+        finally:
+            usage.current.reset(tokens[0])
+            profiles.current.reset(tokens[1])
+            if cost:
+                cost.wall += time.perf_counter() - started
+
+    async def stages(self, language: Language, file: Path, sys_args: str, stream: Stream = None) -> bytes:
+        """
+        compiles a source and runs it, see Codescord.Common.languages.Language.
+
+        the compile stage is skipped for a language that is not compiled or when the program is in
+        the artifact cache. the run stage is not reached if the compilation failed.
+        each stage is timed and times out on its own, the compile stage includes setting the source up
+        for its toolchain and the run stage starting the program.
+
+        :param language: the language of the source.
+        :param file: the source file in its workspace.
+        :param sys_args: system arguments given to the program, or to the compiler for c and c++.
+        :param stream: given the output while the source runs, see Codescord.Common.languages.communicate.
+
+        :raises Errors.ProcessTimedOut: with the stage that took too long, compile or run.
+
+        :return: the output of the program or of the failed compilation.
+        """
+        profile = profiles.current.get()
+        language, placeholders, failed = await within("compile", self.compile(language, file, sys_args),
+                                                      profile.compile_timeout)
+        if failed is not None:
+            return failed
+        process = await within("run", language.start(placeholders), profile.run_timeout)
+        return await communicate(process, stream, self.output_limit)
+
+    @staticmethod
+    async def compile(language: Language, file: Path,
+                      sys_args: str) -> Tuple[Language, Placeholders, Optional[bytes]]:
+        """
+        the compile stage of a source, see stages.
+
+        :param language: the language of the source.
+        :param file: the source file in its workspace.
+        :param sys_args: system arguments given to the program, or to the compiler for c and c++.
+        :return: the language and placeholders from Language.setup and the output of the failed compilation,
+            None if the program is in place.
+        """
+        language, placeholders = await language.setup(file, sys_args)
+        return language, placeholders, await language.build(placeholders)
+
+    async def execute_source(self, language: str, code: bytes, sys_args: str, stream: Stream = None,
+                             queued: Queued = None) -> Tuple[int, bytes, Usage, Profile]:
+        """
+        executes some source code and turns the outcome into a status code.
+
+        a timeout is answered with the stage that timed out instead of an output.
+
+        :param language: the language of the source.
+        :param code: the source code.
+        :param sys_args: system arguments given to the program.
+        :param stream: given the output while the source runs, see Codescord.Common.languages.communicate.
+        :param queued: awaited with how many sources are waiting if the source has to wait for a slot.
+
+        :return: the status code for the outcome, the result from the execution, what it cost
+            and the profile it ran under.
+        """
+        cost = Usage()
+        profile = self.profile(language)
+        if language not in self.languages:
+            logger.info("language %s is not implemented on the server.", language)
+            return Protocol.Status.not_implemented, b"", cost, profile
+        try:
+            return Protocol.Status.text, await self.execute(language, code, sys_args, stream, cost, queued), cost, profile
+        except Errors.ProcessTimedOut as e:
+            logger.info("%s source took longer than its %s timeout.", language, e)
+            return Protocol.Status.process_timeout, str(e).encode("utf-8"), cost, profile
+        finally:
+            logger.debug("processed %s source.", language, extra=vars(cost))
+
+    @staticmethod
+    def pack_result(capabilities: int, output: bytes, cost: Usage, profile: Profile) -> Tuple[bytes, int]:
+        """
+        packs the output of a source with what it cost and the limits it ran under if the client wants to know.
+
+        :param capabilities: the capabilities agreed on for the connection.
+        :param output: the output of the source.
+        :param cost: what processing the source cost.
+        :param profile: the limits the source ran under.
+        :return: the payload and the flags for the frame with the result.
+        """
+        if fields := Server.result_fields(capabilities, cost, profile):
+            return Frame.pack_fields(output, *fields), Frame.Flags.usage
+        return output, 0
+
+    @staticmethod
+    def result_fields(capabilities: int, cost: Usage, profile: Profile) -> Tuple[bytes, ...]:
+        """
+        :param capabilities: the capabilities agreed on for the connection.
+        :param cost: what processing a source cost.
+        :param profile: the limits the source ran under.
+        :return: the fields sent after the output of a source, those the client agreed on.
+        """
+        fields = ()
+        if capabilities & Frame.Capabilities.usage:
+            fields += cost.pack(),
+        if capabilities & Frame.Capabilities.limits:
+            fields += profile.pack(),
+        return fields
+
+    def backpressure(self, reply: Callable[..., Awaitable[None]],
+                     capabilities: int) -> Optional[Queued]:
+        """
+        tells the client that a request has to wait because every slot of self.scheduler is taken.
+
+        the client is told once per request with a queued frame carrying how many sources are waiting
+        and how many the server processes at once, so it can stop sending this server more than it can take.
+
+        :param reply: sends a frame in response to the request, see Server.reply.
+        :param capabilities: the capabilities agreed on for the connection.
+        :return: the callback for Scheduler.slot, None if the client did not agree on Frame.Capabilities.backpressure.
+        """
+        if not capabilities & Frame.Capabilities.backpressure:
+            return None
+        told = False
+
+        async def queued(waiting: int) -> None:
+            nonlocal told
+            if not told:
+                told = True
+                await reply(Frame.Type.queued, Frame.backlog.pack(waiting, self.scheduler.slots), Frame.Flags.more)
+        return queued
+
+    async def process_frame(self, reply: Callable[..., Awaitable[None]], capabilities: int,
+                            flags: int, payload: bytes) -> None:
+        """
+        the framed counterpart to download_source.
+
+        the language, code and sys args arrive packed in a single file frame.
+        the result is sent back in a single frame with the status as its type.
+        unlike the v1 protocol a timeout or an unknown language does not end the connection.
+
+        if the request has the Frame.Flags.stream flag set the output is sent back in text frames
+        flagged with Frame.Flags.more while the source runs. the frame with the status comes last
+        and carries only the output that was not already sent, so whatever was produced before a timeout
+        have already reached the client.
+        if the client agreed on Frame.Capabilities.usage or Frame.Capabilities.limits the frame with the status
+        also carries what the source cost and the limits it ran under.
+        if the server is busy a queued frame is sent before anything else, see backpressure.
+
+        :param reply: sends a frame in response to the request, see Server.reply.
+        :param capabilities: the capabilities agreed on for the connection.
+        :param flags: the flags of the request.
+        :param payload: the packed language, code and sys args.
+        :return: None
+        """
+        logger.debug("handling file...")
+        language, code, sys_args = Frame.unpack_fields(payload)
+        stream = partial(reply, Protocol.Status.text, flags=Frame.Flags.more) if flags & Frame.Flags.stream else None
+        status, stdout, cost, profile = await self.execute_source(
+            language.decode("utf-8"), code, sys_args.decode("utf-8"), stream, self.backpressure(reply, capabilities))
+        await reply(status, *self.pack_result(capabilities, stdout, cost, profile))
+        logger.debug("file handled.")
+
+    async def process_batch(self, reply: Callable[..., Awaitable[None]], capabilities: int,
+                            _: int, payload: bytes) -> None:
+        """
+        handles several sources that arrived together in a batch frame.
+
+        all the sources are executed concurrently and the results are sent back together in one batch frame
+        in the same order as the sources. each result is packed as its status code followed by its output,
+        and what the source cost and the limits it ran under if the client agreed on them.
+        if the server is busy a queued frame is sent before the results, see backpressure.
+
+        :param reply: sends a frame in response to the request, see Server.reply.
+        :param capabilities: the capabilities agreed on for the connection.
+        :param _: the flags of the request, a batch is never streamed.
+        :param payload: the packed sources, each packed the same way as the payload for process_frame.
+        :return: None
+        """
+        logger.debug("handling batch...")
+        sources = [Frame.unpack_fields(source) for source in Frame.unpack_fields(payload)]
+        queued = self.backpressure(reply, capabilities)
+        results = await asyncio.gather(*(
+            self.execute_source(language.decode("utf-8"), code, sys_args.decode("utf-8"), queued=queued)
+            for language, code, sys_args in sources))
+        await reply(Frame.Type.batch, Frame.pack_fields(
+            *(Frame.pack_fields(bytes([status]), stdout, *self.result_fields(capabilities, cost, profile))
+              for status, stdout, cost, profile in results)))
+        logger.debug("batch of %s handled.", len(sources))
+
+    async def reply(self, connection: socket.socket, sending: asyncio.Lock, capabilities: int, request: int,
+                    frame_type: int, payload: bytes = b"", flags: int = 0) -> None:
+        """
+        sends a frame in response to a request.
+
+        the instructions in self.frame_instructions get this method with the connection,
+        lock, capabilities and request id already given so they only need to care about what to send.
+
+        :param connection: the connection to the client.
+        :param sending: held while sending so frames from concurrent requests are not interleaved.
+        :param capabilities: the capabilities agreed on for the connection.
+        :param request: the request id to respond to.
+        :param frame_type: one of the status codes in Protocol.Status or Frame.Type.
+        :param payload: the byte blob to send with the frame.
+        :param flags: flags for the frame.
+        :return: None
+        """
+        async with sending:
+            await self.send_frame(connection, frame_type, payload, flags, request, capabilities)
+
+    @staticmethod
+    async def handle_request(reply: Callable[..., Awaitable[None]], instruction: Callable[..., Awaitable[None]],
+                             capabilities: int, flags: int, payload: bytes) -> None:
+        """
+        runs a single request as its own task.
+
+        a failing request is answered with internal server error without taking the connection
+        or the other requests on it down.
+
+        :param reply: sends a frame in response to the request, see Server.reply.
+        :param instruction: the instruction from self.frame_instructions to run.
+        :param capabilities: the capabilities agreed on for the connection.
+        :param flags: the flags of the request.
+        :param payload: the payload of the request.
+        :return: None
+        """
+        try:
+            await instruction(reply, capabilities, flags, payload)
+        except Exception:
+            logger.exception("request failed.")
+            await reply(Protocol.Status.internal_server_error)
+
+    async def handle_frames(self, connection: socket.socket) -> None:
+        """
+        the main procedure of processing a connection that negotiated the v2 protocol.
+
+        starts by offering the servers fingerprint and capabilities to the client.
+        receives frames until a close frame arrives and dispatches them with self.frame_instructions.
+        every request except the authentication runs as its own task so many requests can be in flight
+        on the same connection and are answered in the order they finish.
+        the authentication is handled before anything else is received.
+        the close frame is not answered, the requests still running are finished before returning.
+
+        :param connection: the connection to the client.
+        :return: None
+        """
+        logger.debug("switched to protocol v%s.", Frame.version)
+        sending = asyncio.Lock()
+        requests: Set[asyncio.Task] = set()
+        capabilities = 0
+        await self.send_frame(connection, Protocol.Status.authenticate, Frame.pack_handshake(Frame.capabilities))
+        try:
+            while (frame := await self.receive_frame(connection))[0] != Protocol.Status.close:
+                frame_type, flags, request, payload = frame
+                reply = partial(self.reply, connection, sending, capabilities, request)
+                if frame_type == Protocol.Status.authenticate:
+                    capabilities = await self.authenticate_frame(reply, payload)
+                elif frame_type in self.frame_instructions:
+                    task = asyncio.create_task(
+                        self.handle_request(reply, self.frame_instructions[frame_type], capabilities, flags, payload))
+                    requests.add(task)
+                    task.add_done_callback(requests.discard)
+                else:
+                    await reply(Protocol.Status.not_implemented)
+            await asyncio.gather(*requests)
+        finally:
+            for task in requests:
+                task.cancel()
+            logger.info("connection closed, compression: %s", self.compression)
+            logger.info("artifact cache: %s", artifacts)
+            logger.info("workspaces: %s", self.workspaces)
+            logger.info("processes: %s", supervisor)
+            logger.info("scheduler: %s", self.scheduler)
+
     async def download_source(self, connection: socket.socket) -> None:
         """
         handles the downloading and execution of a source file.
 
         first downloads the language from the client and sees if its a supported language.
         if it is the language source is downloaded.
-        the source is then saved to a file in a tempdir and executed with
-        procedures from Codescord.Common.Languages.
+        the source is then executed with execute.
         the standard out is captured and sent back to the client.
 
         :raises Errors.ProcessTimedOut: processing the source file took too long.
@@ -96,7 +490,7 @@ class Server(Net):
         :param connection: the connection to the processing server.
         :return: None
         """
-        print("handling file...")
+        logger.debug("handling file...")
         language = (await self.download(connection)).decode("utf-8")
         if language in self.languages:
             await self.send_int_as_bytes(connection, Protocol.Status.success)
@@ -109,22 +503,18 @@ class Server(Net):
 
             await self.assert_response_status(connection, Protocol.Status.awaiting)
 
-            with tempfile.TemporaryDirectory() as tempdir:
-                file = Path(tempdir).joinpath(f"{str(uuid4())}.{language}")
-                with open(file, "wb") as script:
-                    script.write(code)
-                try:
-                    stdout = await asyncio.wait_for(self.languages[language](file, sys_args), Protocol.timeout)
-                except asyncio.TimeoutError:
-                    await self.send_int_as_bytes(connection, Protocol.Status.process_timeout)
-                    raise Errors.ProcessTimedOut(f"process took longer than {Protocol.timeout}")
+            try:
+                stdout = await self.execute(language, code, sys_args)
+            except Errors.ProcessTimedOut:
+                await self.send_int_as_bytes(connection, Protocol.Status.process_timeout)
+                raise
 
             await self.send_int_as_bytes(connection, Protocol.Status.text)
             await self.assert_response_status(connection, Protocol.Status.success)
 
             await self.upload(connection, stdout)
             await self.send_int_as_bytes(connection, Protocol.Status.awaiting)
-            print("file handled.")
+            logger.debug("file handled.")
         else:
             await self.send_int_as_bytes(connection, Protocol.Status.not_implemented)
             raise Errors.LanguageNotImplementedByServer(language)
@@ -140,27 +530,43 @@ class Server(Net):
         :param connection: the connection to the client.
         :return: None
         """
-        print("handling the connection...")
+        logger.debug("handling the connection...")
+        framed = False
         try:
             while (response := await self.response_as_int(connection)) != Protocol.Status.close:
-                if response in self.instructions:
+                if response == Frame.negotiate:
+                    await self.send_int_as_bytes(connection, Protocol.Status.success)
+                    framed = True
+                    await self.handle_frames(connection)
+                    break
+                elif response in self.instructions:
                     await self.send_int_as_bytes(connection, Protocol.Status.success)
                     # noinspection PyArgumentList
                     await self.instructions[response](connection)
                 else:
                     await self.send_int_as_bytes(connection, Protocol.Status.not_implemented)
-            await self.send_int_as_bytes(connection, Protocol.Status.success)
-            print("connection handled.")
-        except Errors.ProcessTimedOut:
-            print(f"process took longer than {Protocol.timeout}s.")
+            else:
+                await self.send_int_as_bytes(connection, Protocol.Status.success)
+            logger.debug("connection handled.")
+        except Errors.ProcessTimedOut as e:
+            logger.info("process took longer than its %s timeout.", e)
         except Errors.LanguageNotImplementedByServer as e:
-            print(f"language {e} is not implemented on the server.")
+            logger.info("language %s is not implemented on the server.", e)
         except Errors.NotImplementedByRecipient as e:
-            print(f"{e} was not implemented on the client.")
+            logger.warning("%s was not implemented on the client.", e)
         except Errors.NotImplementedInProtocol as e:
-            print(f"{e} is not implemented in clients protocol.")
+            logger.warning("%s is not implemented in clients protocol.", e)
+        except ConnectionResetError:
+            logger.info("client disconnected.")
+        except Errors.FrameTooLarge as e:
+            # the payload was never received so nothing after it can be read, the connection is closed
+            logger.warning("client sent a frame that is too large: %s", e)
+            await self.send_frame(connection, Protocol.Status.internal_server_error)
         except Exception as e:
-            await self.send_int_as_bytes(connection, Protocol.Status.internal_server_error)
+            if framed:
+                await self.send_frame(connection, Protocol.Status.internal_server_error)
+            else:
+                await self.send_int_as_bytes(connection, Protocol.Status.internal_server_error)
             raise e
         finally:
             connection.close()
@@ -170,17 +576,21 @@ class Server(Net):
         starts the server.
 
         awaits connections and creates a new task to handle the connection.
+        the toolchains are warmed up in the background meanwhile, see Codescord.Common.languages.warm_up.
 
         :return: None
         """
-        print("awaiting connections...")
+        logger.info("awaiting connections...")
+        warming = asyncio.create_task(warm_up())
         try:
             while True:
                 connection, _ = await self.loop.sock_accept(self.socket)
                 asyncio.create_task(self.handle_connection(connection))
         except ConnectionError:
-            print("Client disconnected.")
+            logger.info("client disconnected.")
         except KeyboardInterrupt:
             pass
         finally:
+            warming.cancel()
+            self.workspaces.close()
             self.socket.close()
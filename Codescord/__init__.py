@@ -1,5 +1,6 @@
 from .Server.server import Server
 from .Client.client import Client
 from .Common.source import Source
+from .Common.logs import setup_logging
 
-__all__ = ["Client", "Source", "Server"]
+__all__ = ["Client", "Source", "Server", "setup_logging"]
@@ -5,7 +5,13 @@ import re
 from .models import ResponseMessages, Servers
 from .message_parser import parse
 import asyncio
+import logging
 import tortoise
+import gzip
+import io
+
+
+logger = logging.getLogger(__name__)
 
 
 class Message:
@@ -49,9 +55,20 @@ class Client(discord.Client):
     if it did reply to that message it will attempt to execute potential source.
     if it never replied to the edited message it will NEVER scan the message for source not execute it even if it did.
     """
-    def __init__(self, start_port: int = 6090, end_port: int = None, loop=None,) -> None:
+    def __init__(self, start_port: int = 6090, end_port: int = None, loop=None,
+                 sockets: str = None, size: int = None,
+                 slots: int = 1, max_jobs: int = 100, max_age: float = 600, standby: int = 0,
+                 results: str = None, ttl: float = 86400) -> None:
         """
         :param loop: asyncio event loop
+        :param sockets: directory for unix sockets to the containers, the port range is used if not given.
+        :param size: the amount of concurrent containers when unix sockets are used.
+        :param slots: how many jobs a single container runs at once.
+        :param max_jobs: how many jobs a container gets before its recycled.
+        :param max_age: how many seconds a container is used before its recycled.
+        :param standby: the least amount of idle containers to keep started.
+        :param results: sqlite database file to cache deterministic results in, nothing is cached if not given.
+        :param ttl: how many seconds a cached result is kept.
 
         :attr loop: the asyncio event loop.
         :attr codescord_client: the client that is responsible for network traffic to the docker container.
@@ -59,14 +76,19 @@ class Client(discord.Client):
         :attr code_pattern: if this re pattern matches its assumed that teh content contains executable code.
         :attr used_ports: ports to docker containers currently in use.
         :attr used_ids: names of docker containers currently in use.
+        :attr message_limit: the most characters discord accepts in a single message.
+        :attr attachment_threshold: outputs with more characters than this in total are attached in full.
         """
         loop = loop if not loop else asyncio.get_event_loop()
         super(Client, self).__init__(loop=loop)
-        self.codescord_client = Codescord.Client(start_port, end_port, loop)
+        self.codescord_client = Codescord.Client(start_port, end_port, loop, sockets, size,
+                                                 slots, max_jobs, max_age, standby, results, ttl)
         self.manual_pattern = re.compile(r"/run\s*([^\n]*)\s*(?<!\\)`{3}([^\n]+)\n((?:(?!`{3}).)+)`{3}", re.DOTALL)
         self.auto_pattern = re.compile(r"(?<!\\)`{3}([^\n]+)\n((?:(?!`{3}).)+)`{3}", re.DOTALL)
         self.used_ports: Set[int] = set()
         self.used_ids: Set[str] = set()
+        self.message_limit = 2000
+        self.attachment_threshold = 8000
 
     async def process_commands(self, message: Union[Message, discord.Message]) -> bool:
         """
@@ -96,12 +118,61 @@ class Client(discord.Client):
                 return True
         return False
 
+    def render(self, results: List[str], attach=True) -> Tuple[str, Optional[discord.File]]:
+        """
+        picks the cheapest way to deliver the execution results in a single message.
+
+        if every result fits in a code block within self.message_limit they are sent inline.
+        otherwise the characters left after the code blocks, the newlines between them and the markers
+        are shared between the results, short results are kept whole and the longer ones
+        are cut with a marker saying how much is missing.
+        if more than self.attachment_threshold characters would be missing the full results are
+        also attached as a gzip compressed text file.
+        if there are so many results that not even their code blocks fit, the message only points to the attachment,
+        or says that the results are too long if there can be no attachment.
+
+        :param results: the execution results (stdout) to deliver.
+        :param attach: if the full results may be attached, an edited message can not get an attachment.
+        :return: the content of the message and the attachment if one is needed.
+        """
+        results = [result if result else "Code gave no result but compiled and ran successfully."
+                   for result in results]
+        content = "\n".join(f"{'`' * 3}\n{result}\n{'`' * 3}" for result in results)
+        if len(content) <= self.message_limit:
+            return content, None
+
+        attachment = attach and sum(map(len, results)) > self.attachment_threshold
+        marker = "\n... {} more characters" + (", see the attachment." if attachment else ".")
+        # the code blocks, the newlines between them and a marker in each result, a result is never missing
+        # more characters than it has so its marker is never longer than the one for the whole result
+        fixed = sum(len(f"{'`' * 3}\n\n{'`' * 3}") + len(marker.format(len(result))) for result in results)
+        available = self.message_limit - fixed - (len(results) - 1)
+        shares = [0] * len(results)
+        for position, index in enumerate(sorted(range(len(results)), key=lambda i: len(results[i]))):
+            shares[index] = max(min(len(results[index]), available // (len(results) - position)), 0)
+            available -= shares[index]
+        content = "\n".join(
+            f"{'`' * 3}\n{result[:share]}"
+            f"{marker.format(len(result) - share) if share < len(result) else ''}"
+            f"\n{'`' * 3}"
+            for result, share in zip(results, shares))
+
+        if len(content) > self.message_limit:
+            if not attach:
+                return f"The {len(results)} results are too long to show in a message.", None
+            attachment = True
+            content = f"The {len(results)} results are too long to show in a message, see the attachment."
+        if not attachment:
+            return content, None
+        full = "\n\n".join(results).encode("utf-8")
+        return content, discord.File(io.BytesIO(gzip.compress(full)), filename="output.txt.gz")
+
     async def manual_process(self, message: Union[Message, discord.Message]):
         """
         the same as self.auto_process but with different pattern.
 
         :param message: discord message from some user to attempt to process.
-        :return: execution result (stdout)
+        :return: execution results (stdout), see self.render for how they are sent.
         """
         if message.author != self.user:
             if match := self.manual_pattern.findall(message.content):
@@ -109,17 +180,7 @@ class Client(discord.Client):
                     Codescord.Source(language, code, sys_args)
                     for sys_args, language, code in match
                 ]
-                source_process_tasks: List[asyncio.Task] = [
-                    asyncio.create_task(self.codescord_client.schedule_process(source))
-                    for source in sources
-                ]
-                results: List[str] = [
-                    (f"{'`' * 3}\n"
-                     f"{result if (result := await task) else 'Code gave no result but compiled and ran successfully.'}"
-                     f"\n{'`' * 3}")
-                    for task in source_process_tasks
-                ]
-                return results
+                return await self.codescord_client.schedule_batch(sources)
 
     async def auto_process(self, message: Union[Message, discord.Message]) -> List[str]:
         """
@@ -127,9 +188,10 @@ class Client(discord.Client):
 
         if a highlighted code block is found a Codescord.Source object is made
         (containing the language highlight and the source.
+        all the sources in the message are scheduled together as one batch so they share a single container.
         a unused port and id is generated for the docker container and container will be started.
         self.codescord_client will attempt to connect to the Codescord.Server inside the container
-        and send over the source.
+        and send over the sources.
         (OBS! the first connection attempt self.codescord_client will most of the time happen before the container is
         started but it should always succeed on the first retry)
         after the source have been successfully or unsuccessfully processed a parallel task is started to handle
@@ -138,7 +200,7 @@ class Client(discord.Client):
         there is a fallback in main.py to stop and remove the containers from the image `codescord`.)
 
         :param message: discord message from some user to attempt to process.
-        :return: execution result (stdout)
+        :return: execution results (stdout), see self.render for how they are sent.
         """
         if message.author != self.user:
             if match := self.auto_pattern.findall(message.content):
@@ -146,17 +208,7 @@ class Client(discord.Client):
                     Codescord.Source(language, code)
                     for language, code in match
                 ]
-                source_process_task: List[asyncio.Task] = [
-                    asyncio.create_task(self.codescord_client.schedule_process(source))
-                    for source in sources
-                ]
-                results: List[str] = [
-                    (f"{'`' * 3}\n"
-                     f"{result if (result := await task) else 'Code gave no result but compiled and ran successfully.'}"
-                     f"\n{'`' * 3}")
-                    for task in source_process_task
-                ]
-                return results
+                return await self.codescord_client.schedule_batch(sources)
 
     async def on_raw_message_edit(self, event: discord.RawMessageUpdateEvent) -> None:
         """
@@ -186,11 +238,11 @@ class Client(discord.Client):
                 db_response_message.message_id)
 
             if results := (await self.manual_process(message)):
-                edit = "\n".join(results)
+                edit, _ = self.render(results, attach=False)
                 await response_message.edit(content=edit)
             elif (await Servers.get_server(server_id=message.guild.id)).auto_run:
                 if results := (await self.auto_process(message)):
-                    edit = "\n".join(results)
+                    edit, _ = self.render(results, attach=False)
                     await response_message.edit(content=edit)
 
         except tortoise.exceptions.DoesNotExist:
@@ -214,7 +266,8 @@ class Client(discord.Client):
             if await self.process_commands(message):
                 pass
             if results := (await self.manual_process(message)):
-                response: discord.Message = await message.channel.send(f"{chr(10).join(results)}")
+                content, file = self.render(results)
+                response: discord.Message = await message.channel.send(content, file=file)
                 response_message = await ResponseMessages.create_message(
                     server_id=message.guild.id,
                     channel_id=message.channel.id,
@@ -223,7 +276,8 @@ class Client(discord.Client):
                 await response_message.save()
             elif (await Servers.get_server(server_id=message.guild.id)).auto_run:  # retry with auto run if it is on
                 if results := (await self.auto_process(message)):
-                    response: discord.Message = await message.channel.send(f'{chr(10).join(results)}')
+                    content, file = self.render(results)
+                    response: discord.Message = await message.channel.send(content, file=file)
                     response_message = await ResponseMessages.create_message(
                         server_id=message.guild.id,
                         channel_id=message.channel.id,
@@ -290,4 +344,4 @@ class Client(discord.Client):
                 await self.fetch_guild(server.server_id)
             except (discord.Forbidden, discord.HTTPException):
                 await server.delete()
-        print("online.")
+        logger.info("online.")
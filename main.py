@@ -8,6 +8,10 @@ import os
 import argparse
 from pathlib import Path
 import subprocess
+import logging
+
+
+logger = logging.getLogger(__name__)
 
 
 def process(stdin: str, capture_output=True) -> Optional[str]:
@@ -85,27 +89,34 @@ def run_client(args: argparse.Namespace) -> None:
     :return: None
     """
     loop = asyncio.get_event_loop()
+    client = None
     try:
         loop.run_until_complete(init_tortoise())
         token = os.environ.get("DISCORD_CODESCORD")
         start_port, end_port = args.p.split(":")
-        client = Discord.Client(start_port=int(start_port), end_port=int(end_port), loop=loop)
+        client = Discord.Client(start_port=int(start_port), end_port=int(end_port), loop=loop,
+                                sockets=args.u, size=args.n,
+                                slots=args.slots, max_jobs=args.max_jobs, max_age=args.max_age,
+                                standby=args.standby, results=args.result_cache, ttl=args.result_ttl)
         loop.run_until_complete(client.start(token))
     finally:
         loop.run_until_complete(Tortoise.close_connections())
-        print("closing containers...")
+        if client and (results := client.codescord_client.results):
+            logger.info("closing result cache (%s)...", results)
+            results.close()
+        logger.info("closing containers...")
         close_containers()
-        print("closed containers.")
+        logger.info("closed containers.")
 
 
-def run_server(_: argparse.Namespace) -> None:
+def run_server(args: argparse.Namespace) -> None:
     """
     starts the Codescord.Server.
 
     :return: None
     """
     loop = asyncio.get_event_loop()
-    server = Codescord.Server(loop=loop)
+    server = Codescord.Server(loop=loop, sockets=args.u, output_limit=args.output_limit)
     loop.run_until_complete(server.run())
 
 
@@ -123,7 +134,38 @@ if __name__ == '__main__':
                         help=mode_help)
     parser.add_argument("-p", type=str, nargs="?", default="6090:6096",
                         help="port range for the application. 1 port=1 concurrent container.")
+    parser.add_argument("-u", type=str, nargs="?", default=None,
+                        help="directory for unix sockets, replaces the port range. "
+                             "the client makes one directory per container in it, the server listens in it.")
+    parser.add_argument("-n", type=int, nargs="?", default=7,
+                        help="amount of concurrent containers when unix sockets are used.")
+    parser.add_argument("-s", "--slots", type=int, nargs="?", default=1,
+                        help="amount of jobs a single container runs at once.")
+    parser.add_argument("--max-jobs", type=int, nargs="?", default=100,
+                        help="amount of jobs a container runs before its replaced.")
+    parser.add_argument("--max-age", type=float, nargs="?", default=600,
+                        help="seconds a container is used before its replaced.")
+    parser.add_argument("--standby", type=int, nargs="?", default=1,
+                        help="least amount of idle containers to keep started, "
+                             "more are kept after bursts of messages.")
+    parser.add_argument("--result-cache", type=str, nargs="?", default=None,
+                        help="sqlite file to cache the results of deterministic code in, off if not given.")
+    parser.add_argument("--result-ttl", type=float, nargs="?", default=86400,
+                        help="seconds a cached result is kept.")
+    parser.add_argument("-l", "--log-level", type=str, nargs="?",
+                        default=os.environ.get(Codescord.Common.logs.variable, "info"),
+                        help="log level, optionally followed by levels for single modules, "
+                             "for example 'warning,Codescord.Common.net=debug'. "
+                             "is passed on to the docker containers.")
+    parser.add_argument("-o", "--output-limit", type=int, nargs="?",
+                        default=int(os.environ.get(Codescord.Common.languages.output_variable,
+                                                   Codescord.Common.languages.output_limit)),
+                        help="the most bytes of output a single source may produce before it is stopped. "
+                             "is passed on to the docker containers.")
     result = parser.parse_args()
+    Codescord.setup_logging(result.log_level)
+    os.environ[Codescord.Common.logs.variable] = result.log_level
+    os.environ[Codescord.Common.languages.output_variable] = str(result.output_limit)
 
     try:
         if result.mode in modes: